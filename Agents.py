@@ -1,10 +1,18 @@
+import heapq
+import itertools
 import math
+import os
+import time
 from abc import ABC, abstractmethod
 from collections.abc import Callable
-from typing import Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Union
 
-from Fringes import Fringe
+from Fringes import DoubleEndedPriorityQueue, Fringe, IndexedPriorityQueue, Stack, VisitedMap
+from Metrics import SearchMetrics
+from Tracing import SearchTrace
 from World import World, StateNode
+from util import LRUCache
 
 SUCCESS = 1
 FAILURE = 0
@@ -18,8 +26,10 @@ class Agent(ABC):
         self.goal_state = None
         self.terminated = 0
         self.world = None
+        self.metrics = None
 
-    def set_goal_state(self, goal_state: Callable[[StateNode], bool]):
+    def set_goal_state(self, goal_state: Callable[[Union[StateNode, World]], bool]):
+        # goal tests read remaining_people / remaining_brittle, of a search state or of the current world
         self.goal_state = goal_state
 
     def set_world(self, world: World):
@@ -39,6 +49,11 @@ class Agent(ABC):
     def act(self, world: World):
         pass
 
+    def results(self):
+        fringe = getattr(self, "fringe", None)
+        return {"name": self.name, "score": self.score, "time": self.time, "evacuated": self.evacuated,
+                "actions": self.actions, "expanded": fringe.get_added_so_far() if fringe is not None else 0}
+
     def __str__(self):
         return f"name: {self.name} " \
                f"score: {self.score} " \
@@ -50,8 +65,7 @@ class Agent(ABC):
 
 class HumanAgent(Agent):
     def act(self, world: World):
-        if self.goal_state(
-                StateNode(self.state, None, world, world.get_people_status(), world.get_broken_vertices_status())):
+        if self.goal_state(world):
             print("Woohoo!")
             self.terminated = 1
         while (move := int(input("Insert next vertex to move, 'Enter' for no-op "))) >= 0 and not world.valid_action(
@@ -65,8 +79,7 @@ class HumanAgent(Agent):
 class StupidGreedy(Agent):
 
     def act(self, world: World):
-        if self.goal_state(StateNode(self.state, None, self.world, self.world.get_people_status(),
-                                     self.world.get_broken_vertices_status())):
+        if self.goal_state(self.world):
             print("Woohoo!")
             self.terminated = 1
             return
@@ -82,22 +95,14 @@ class StupidGreedy(Agent):
         return next_move
 
     def calculate_path(self, world: World):
-        current_path = []
-        shortest_v_value = math.inf
         broken_vertices = world.get_broken_vertices_status()
-        for v, n_people in world.get_people_status().items():
-            if n_people > 0 and v not in broken_vertices:
-                dist, path = world.get_shortest_path(self.state, v)
-                if path and dist < shortest_v_value:
-                    shortest_v_value = dist
-                    current_path = path
-        return current_path
+        targets = [v for v in world.get_people_vertices() if v not in broken_vertices]
+        return world.get_nearest_target(self.state, targets)[1]
 
 
 class SaboteurAgent(Agent):
     def act(self, world: World):
-        if self.goal_state(StateNode(self.state, None, self.world, self.world.get_people_status(),
-                                     self.world.get_broken_vertices_status())):
+        if self.goal_state(self.world):
             print("Woohoo!")
             self.terminated = 1
             return
@@ -109,39 +114,45 @@ class SaboteurAgent(Agent):
         if not world.valid_action(self.state, next_move):
             self.actions += 1
             return
-        self.time += self.world.get_weight(self.state, next_move)
-        self.state = next_move
+        self.handle_move(next_move)
         return next_move
 
+    def handle_move(self, dst):
+        # the saboteur only travels, it leaves the people where they are
+        self.time += self.world.get_weight(self.state, dst)
+        self.state = dst
+
     def calculate_path(self, world: World):
-        current_path = []
         broken_nodes = world.get_broken_vertices_status()
-        shortest_v_value = math.inf
-        for v in world.get_brittle_vertices():
-            if v not in broken_nodes:
-                dist, path = world.get_shortest_path(self.state, v)
-                if path and dist < shortest_v_value:
-                    shortest_v_value = dist
-                    current_path = path
-        return current_path
+        targets = [v for v in world.get_brittle_vertices() if v not in broken_nodes]
+        return world.get_nearest_target(self.state, targets)[1]
 
-    def set_goal_state(self, goal_state: Callable[[StateNode], bool]):
-        self.goal_state = lambda state: len(list(self.world.get_brittle_vertices())) == len(state.broken_nodes_status)
+    def set_goal_state(self, goal_state: Callable[[Union[StateNode, World]], bool]):
+        self.goal_state = lambda state: state.remaining_brittle == 0
 
 
 class InformedSearchAgent(Agent):
-    def __init__(self, state, name: str, f: Callable[[Any, Any, World], float], fringe: Fringe, limit=10000):
+    def __init__(self, state, name: str, f: Callable[[Any, Any, World], float], fringe: Fringe, limit=10000,
+                 trace: SearchTrace = None, incremental=False, batch_f: Callable[[Any, list, World], list] = None,
+                 metrics: SearchMetrics = None):
         Agent.__init__(self, state, name)
+        self.metrics = metrics
         self.f = f
+        # evaluates f for all the children of a node at once, known heuristics get theirs by default
+        self.batch_f = batch_f if batch_f is not None else BATCHED_F.get(f)
         self.fringe = fringe
         self.limit = limit
-        self.closed = []
+        self.trace = trace
+        self.incremental = incremental
+        self.closed = VisitedMap()
         self.sequence = []
+        self.plan = []  # the nodes of sequence
+        self.expected = None  # the node of the last move, in the previous search tree
         self.calculated = False
 
     def act(self, world):
         if not self.calculated:
-            node, status = self.calculate_path()  # StateNode(self.state, parent=None, world=self.world)
+            node, status = self.calculate_path()
             if not status:
                 print("Failure")
                 self.terminated = 1
@@ -151,73 +162,253 @@ class InformedSearchAgent(Agent):
         if not self.sequence:
             self.terminated = 1
             return
-        next_move = self.sequence.pop()
+        next_move = self.next_move()
         if not world.valid_action(self.state, next_move):
             self.terminated = 1
             print("Boooooooo")
             return
         self.handle_move(next_move)
-        if self.goal_state(
-                StateNode(next_move, None, world, world.get_people_status(), world.get_broken_vertices_status())):
+        if self.goal_state(world.state_node(next_move)):
             print("Woohoo!")
             self.terminated = 1
         return next_move
 
+    def start_search(self):
+        root = self.world.state_node(self.state)
+        if self.incremental and self.reroot(root):
+            return
+        self.fringe.initialize()
+        self.closed = VisitedMap()
+        self.closed.offer(root)
+        self.fringe.push(root)
+
+    def reroot(self, root: StateNode):
+        """
+        Seeds the search with the subtree of the previous search tree under the node the agent was expected to reach.
+        Subtrees entering a vertex that broke since then are dropped, the rest keep their g values, closed nodes stay
+        closed and only the frontier gets new f values. People rescued by others change the goal, so in that case
+        the search starts over.
+        """
+        r = self.expected
+        if r is None or r.location != root.location or r.rescued != root.rescued or r.broken & ~root.broken:
+            return False
+        broken = root.broken & ~r.broken
+        tree = self.closed
+        children = {}
+        for node in tree.best_nodes.values():
+            if node.parent is not None:
+                children.setdefault(node.parent.key, []).append(node)
+        self.fringe.initialize()
+        self.closed = VisitedMap()
+        closed = []
+        stack = [(r, root)]
+        while stack:
+            old, new = stack.pop()
+            self.closed.offer(new)
+            if old.key in tree.expanded:
+                self.closed.should_expand(new)
+                closed.append(new)
+            else:
+                if new.parent is not None:
+                    new.f_value = self.f(new.parent, new.state, self.world)
+                self.fringe.push(new)
+            for child in children.get(old.key, ()):
+                if not broken >> child.location & 1:
+                    stack.append((child, StateNode(child.location, new, self.world, child.rescued,
+                                                   child.broken | broken, g_value=child.g_value - r.g_value)))
+        # children dropped as duplicates of nodes outside the kept subtree have to be generated again
+        for node in closed:
+            self.push_children(node)
+        return True
+
     def calculate_path(self):
         iterations = 0
-        node = StateNode(self.state, None, self.world, self.world.get_people_status(),
-                         self.world.get_broken_vertices_status())
-        self.fringe.push(node)
+        self.start_search()
         while not self.fringe.is_empty():
             iterations += 1
-            node = self.fringe.pop()
+            node = self.pop()
             if self.goal_state(node):
                 return node, SUCCESS
             if iterations >= self.limit:
                 return node, FAILURE
-            if node not in self.closed:
-                self.closed.append(node)
-                self.fringe.push_all(self.expand(node))
+            if self.should_expand(node):
+                if self.trace:
+                    self.trace.expansion(node, agent=self.name, iteration=iterations)
+                self.push_children(node)
         return node, FAILURE
 
+    def pop(self):
+        if not self.metrics:
+            return self.fringe.pop()
+        with self.metrics.phase("fringe"):
+            return self.fringe.pop()
+
+    def should_expand(self, node: StateNode):
+        if not self.metrics:
+            return self.closed.should_expand(node)
+        with self.metrics.phase("closed"):
+            expand = self.closed.should_expand(node)
+        self.metrics.count("expanded", expand)
+        return expand
+
+    def push_children(self, node: StateNode):
+        if not self.metrics:
+            self.fringe.push_all(self.expand(node))
+            return
+        children = list(self.expand(node))
+        with self.metrics.phase("fringe"):
+            self.fringe.push_all(children)
+
+    def successors(self, node: StateNode) -> list:
+        # the children of node that are not duplicates, without their f values
+        metrics = self.metrics
+        if metrics:
+            start = time.perf_counter()
+        children = []
+        for n in self.world.get_neighbors(node.state):
+            child = self.world.child_node(node, n, g_value=node.g_value + self.world.get_weight(node.state, n))
+            if self.closed.offer(child):
+                children.append(child)
+            elif metrics:
+                metrics.count("duplicates")
+        if metrics:
+            metrics.add_time("successors", time.perf_counter() - start)
+            metrics.count("generated", len(children))
+            metrics.count("heuristic_calls", len(children))
+        return children
+
     def expand(self, node: StateNode) -> iter:
-        return map(lambda n: StateNode(n, node, self.world, node.people_status, node.broken_nodes_status,
-                                       f_value=self.f(node, n, self.world),
-                                       g_value=node.g_value + self.world.get_weight(node.state, n)),
-                   self.world.get_neighbors(node.state))
+        children = self.successors(node)
+        self.measured_evaluate(node, children)
+        for child in children:
+            if self.trace:
+                self.trace.push(child, agent=self.name, parent=node.state)
+            yield child
+
+    def measured_evaluate(self, node: StateNode, children: list):
+        # evaluate, with its time and MST cache use in the metrics
+        metrics = self.metrics
+        if not metrics:
+            self.evaluate(node, children)
+            return
+        start, cache = time.perf_counter(), self.world.get_MST_cache_stats()
+        self.evaluate(node, children)
+        metrics.add_time("heuristic", time.perf_counter() - start)
+        after = self.world.get_MST_cache_stats()
+        metrics.count("mst_cache_hits", after["hits"] - cache["hits"])
+        metrics.count("mst_cache_misses", after["misses"] - cache["misses"])
+        metrics.count("mst_table_hits", after["table_hits"] - cache["table_hits"])
+
+    def evaluate(self, node: StateNode, children: list):
+        # sets the f value of node's children
+        if self.batch_f:
+            f_values = self.batch_f(node, [child.state for child in children], self.world)
+        else:
+            f_values = [self.f(node, child.state, self.world) for child in children]
+        for child, f_value in zip(children, f_values):
+            child.f_value = f_value
 
     def reconstruct_path(self, node: StateNode):
         while node.parent:
             self.sequence.append(node.state)
+            self.plan.append(node)
             node = node.parent
 
+    def next_move(self):
+        self.expected = self.plan.pop() if self.plan else None
+        return self.sequence.pop()
+
+    def clear_plan(self):
+        self.sequence.clear()
+        self.plan.clear()
+
     @staticmethod
     def get_path_to_closest_nodes(c, world: World, nodes_list: list):
-        shortest_v_value = math.inf
-        current_path = []
-        for v in nodes_list:
-            dist, path = world.get_shortest_path(c, v)
-            if path and dist < shortest_v_value:
-                shortest_v_value = dist
-                current_path = path
-        return shortest_v_value, current_path
+        return world.get_nearest_target(c, nodes_list)
+
+    @staticmethod
+    def is_blocked(p: StateNode, c, world: World):
+        # c is broken, or broke earlier on p's path while there are still people to reach from it
+        return world.is_broken(c) or bool(p.broken >> world.vertex_index[c] & 1 and world.people_mask & ~p.rescued)
 
     @staticmethod
     def MST_heuristic(p: StateNode, c, world: World):
         # get all vertices with people in them
-        if c in world.get_broken_vertices_status():
+        if InformedSearchAgent.is_blocked(p, c, world):
             return math.inf
-        v_with_people = [v for v, n_people in p.people_status.items() if n_people > 0]
-        return world.get_MST_size(around_nodes=v_with_people + [c], without_nodes=p.broken_nodes_status)
+        v_with_people = world.people_mask & ~p.rescued
+        # the people then c, pairs with c are measured from the people's ends
+        location = world.vertex_index[c]
+        return world.get_MST_size_of_masks(v_with_people | 1 << location, p.broken, last=location)
 
     @staticmethod
     def A_star_func(p: StateNode, c, world: World):
         return InformedSearchAgent.MST_heuristic(p, c, world) + p.g_value + world.get_weight(p.state, c)
 
+    @staticmethod
+    def MST_heuristic_batch(p: StateNode, children: list, world: World):
+        # MST_heuristic of every child, all siblings share p's people and broken sets
+        blocked = [InformedSearchAgent.is_blocked(p, c, world) for c in children]
+        open_children = [world.vertex_index[c] for c, b in zip(children, blocked) if not b]
+        sizes = iter(world.get_MST_sizes_with(world.people_mask & ~p.rescued, open_children, p.broken))
+        return [math.inf if b else next(sizes) for b in blocked]
+
+    @staticmethod
+    def A_star_batch(p: StateNode, children: list, world: World):
+        return [h + p.g_value + world.get_weight(p.state, c)
+                for c, h in zip(children, InformedSearchAgent.MST_heuristic_batch(p, children, world))]
+
+    @staticmethod
+    def ALT_heuristic(p: StateNode, c, world: World):
+        # every remaining person has to be reached, so the landmark bound to the farthest one is admissible
+        if InformedSearchAgent.is_blocked(p, c, world):
+            return math.inf
+        location = world.vertex_index[c]
+        return world.get_landmark_bound(location, world.people_mask & ~p.rescued & ~(1 << location))
+
+    @staticmethod
+    def A_star_ALT(p: StateNode, c, world: World):
+        return InformedSearchAgent.ALT_heuristic(p, c, world) + p.g_value + world.get_weight(p.state, c)
+
+    @staticmethod
+    def farthest_people_heuristic(p: StateNode, c, world: World):
+        if InformedSearchAgent.is_blocked(p, c, world):
+            return math.inf
+        location = world.vertex_index[c]
+        return world.get_farthest_distance(location, world.people_mask & ~p.rescued & ~(1 << location), p.broken)
+
+    @staticmethod
+    def A_star_farthest_people(p: StateNode, c, world: World):
+        return InformedSearchAgent.farthest_people_heuristic(p, c, world) + p.g_value + world.get_weight(p.state, c)
+
+
+BATCHED_F = {
+    InformedSearchAgent.MST_heuristic: InformedSearchAgent.MST_heuristic_batch,
+    InformedSearchAgent.A_star_func: InformedSearchAgent.A_star_batch,
+}
+
+# heuristic name -> (h, g + h)
+HEURISTICS = {
+    "mst": (InformedSearchAgent.MST_heuristic, InformedSearchAgent.A_star_func),
+    "alt": (InformedSearchAgent.ALT_heuristic, InformedSearchAgent.A_star_ALT),
+    "farthest": (InformedSearchAgent.farthest_people_heuristic, InformedSearchAgent.A_star_farthest_people),
+}
+
 
 class RTInformedSearchAgent(InformedSearchAgent):
-    def __init__(self, state, name: str, f: Callable[[Any, Any, World], float], fringe: Fringe, limit=10000):
-        InformedSearchAgent.__init__(self, state, name, f, fringe, limit)
+    """
+    Each search stops after limit expansions and the agent walks to the best frontier node before searching again,
+    so the new root was never expanded and no subtree carries over. Incrementally, as in RTAA*, a search instead
+    leaves every state it expanded the h value f(frontier) - g(state), which later searches use where it beats f's
+    own heuristic. Learned values are keyed on what the rest of the way depends on (location, people left, broken
+    vertices), so they also hold for the same state reached along another path.
+    """
+
+    def __init__(self, state, name: str, f: Callable[[Any, Any, World], float], fringe: Fringe, limit=10000,
+                 trace: SearchTrace = None, incremental=False, batch_f: Callable[[Any, list, World], list] = None,
+                 metrics: SearchMetrics = None):
+        InformedSearchAgent.__init__(self, state, name, f, fringe, limit, trace, incremental, batch_f, metrics)
+        self.learned = {}
 
     def act(self, world: World):
         if not self.calculated or len(self.sequence) == 0:
@@ -227,54 +418,201 @@ class RTInformedSearchAgent(InformedSearchAgent):
                 return
             self.handle_not_failure(node)
             return self.act(world)
-        next_move = self.sequence.pop()
+        next_move = self.next_move()
         if not world.valid_action(self.state, next_move):
             self.terminated = 1
             print("Boooooooo")
             return
         self.handle_move(next_move)
-        if self.goal_state(
-                StateNode(next_move, None, world, world.get_people_status(), world.get_broken_vertices_status())):
+        if self.goal_state(world.state_node(next_move)):
             print("Woohoo!")
             self.terminated = 1
         return next_move
 
     def calculate_path(self):
-        self.fringe.initialize()
-        self.closed.clear()
-        node = StateNode(self.state, None, self.world, self.world.get_people_status(),
-                         self.world.get_broken_vertices_status())
-        self.fringe.push(node)
+        self.start_search()
         iterations = 0
         while not self.fringe.is_empty():
             iterations += 1
-            node = self.fringe.pop()
+            node = self.pop()
             if self.goal_state(node):
                 return node, SUCCESS
             if iterations > self.limit:
+                if self.incremental:
+                    self.learn(node)
                 return node, ON_PROCESS
-            if node not in self.closed:
-                self.closed.append(node)
-                self.fringe.push_all(self.expand(node))
+            if self.should_expand(node):
+                if self.trace:
+                    self.trace.expansion(node, agent=self.name, iteration=iterations)
+                self.push_children(node)
         return node, FAILURE
 
+    @staticmethod
+    def learned_key(node: StateNode):
+        return node.location, node.world.people_mask & ~node.rescued, node.broken
+
+    def learn(self, frontier: StateNode):
+        for key in self.closed.expanded:
+            node = self.closed.best_nodes[key]
+            h = frontier.f_value - node.g_value
+            if h > self.learned.get(self.learned_key(node), -math.inf):
+                self.learned[self.learned_key(node)] = h
+        if self.metrics:
+            self.metrics.count("learned", len(self.closed.expanded))
+
+    def evaluate(self, node: StateNode, children: list):
+        InformedSearchAgent.evaluate(self, node, children)
+        if not self.learned:
+            return
+        for child in children:
+            h = self.learned.get(self.learned_key(child))
+            if h is not None and child.g_value + h > child.f_value:
+                child.f_value = child.g_value + h
+
     def handle_failure(self):
         print(f"{self.name} Failed")
         self.terminated = 1
 
     def handle_not_failure(self, node: StateNode):
-        self.sequence.clear()
+        self.clear_plan()
         self.reconstruct_path(node)
         self.calculated = 1
 
 
 class Bonus(InformedSearchAgent):
     def act(self, world):
-        self.fringe.initialize()
-        self.closed.clear()
-        self.sequence.clear()
-        node, status = self.calculate_path()
-        if not status:
+        # incrementally, the rest of the plan is still optimal as long as the world went as predicted
+        if not (self.incremental and self.sequence and self.expected is not None
+                and self.expected.key == world.state_node(self.state).key):
+            self.clear_plan()
+            node, status = self.calculate_path()
+            if not status:
+                print("Failure")
+                self.terminated = 1
+                return
+            self.reconstruct_path(node)
+        if not self.sequence:
+            self.terminated = 1
+            return
+        next_move = self.next_move()
+        if not world.valid_action(self.state, next_move):
+            print(f"{self.name} Failed")
+            self.terminated = 1
+            return
+        self.handle_move(next_move)
+        if self.goal_state(world.state_node(next_move)):
+            print("Woohoo!")
+            self.terminated = 1
+        return next_move
+
+
+# the world of a ParallelSearchAgent worker process, set once by _init_worker
+_worker_world = None
+
+
+def _init_worker(world: World):
+    global _worker_world
+    _worker_world = world
+
+
+def _evaluate(f, batch_f, parents: list) -> list:
+    # parents: (location, rescued, broken, g_value, children states), the f values of every parent's children
+    f_values = []
+    for location, rescued, broken, g_value, children in parents:
+        p = StateNode(location, None, _worker_world, rescued, broken, g_value=g_value)
+        f_values.append(batch_f(p, children, _worker_world) if batch_f else
+                        [f(p, c, _worker_world) for c in children])
+    return f_values
+
+
+class ParallelSearchAgent(InformedSearchAgent):
+    """
+    A* evaluating the f values of children in a pool of worker processes, each with its own copy of the world.
+    Up to batch_size nodes are popped and expanded together, and their children are split between the workers.
+    A goal is only returned when it is popped with an empty batch, so every child of every expanded node is queued
+    by then and the result is as optimal as serial A*; only the expansion order (and count) may differ.
+    """
+
+    def __init__(self, state, name: str, f: Callable[[Any, Any, World], float], fringe: Fringe, limit=10000,
+                 workers=None, batch_size=None, trace: SearchTrace = None,
+                 batch_f: Callable[[Any, list, World], list] = None, metrics: SearchMetrics = None):
+        InformedSearchAgent.__init__(self, state, name, f, fringe, limit, trace, batch_f=batch_f, metrics=metrics)
+        self.workers = workers or os.cpu_count()
+        # a few nodes per worker, larger batches mostly expand nodes serial A* would never reach
+        self.batch_size = batch_size or 4 * self.workers
+
+    def start_search(self):
+        InformedSearchAgent.start_search(self)
+        # batches expand nodes ahead of serial A*, sometimes before their cheapest path was generated
+        self.closed.reopen = True
+
+    def calculate_path(self):
+        # the world does not change during a search, so the workers get a snapshot of it
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.world,)) as executor:
+            iterations = 0
+            node = None
+            self.start_search()
+            while not self.fringe.is_empty():
+                batch = []
+                while not self.fringe.is_empty() and len(batch) < self.batch_size:
+                    if batch and self.goal_state(self.fringe.peek()):
+                        break
+                    iterations += 1
+                    node = self.pop()
+                    if self.goal_state(node):
+                        return node, SUCCESS
+                    if iterations >= self.limit:
+                        return node, FAILURE
+                    if self.should_expand(node):
+                        if self.trace:
+                            self.trace.expansion(node, agent=self.name, iteration=iterations)
+                        batch.append(node)
+                self.push_batch(executor, batch)
+        return node, FAILURE
+
+    def push_batch(self, executor: ProcessPoolExecutor, batch: list):
+        expanded = [(node, children) for node in batch if (children := self.successors(node))]
+        parents = [(node.location, node.rescued, node.broken, node.g_value, [child.state for child in children])
+                   for node, children in expanded]
+        chunk = max(1, -(-len(parents) // self.workers))
+        if self.metrics:
+            start = time.perf_counter()
+        f_values = [f for chunk_f in executor.map(_evaluate, itertools.repeat(self.f), itertools.repeat(self.batch_f),
+                                                   [parents[i:i + chunk] for i in range(0, len(parents), chunk)])
+                    for f in chunk_f]
+        if self.metrics:
+            self.metrics.add_time("heuristic", time.perf_counter() - start)
+        for (node, children), node_f in zip(expanded, f_values):
+            for child, f_value in zip(children, node_f):
+                child.f_value = f_value
+                if self.trace:
+                    self.trace.push(child, agent=self.name, parent=node.state)
+            self.fringe.push_all(children)
+
+
+class AnytimeSearchAgent(InformedSearchAgent):
+    """
+    ARA*: a series of weighted A* searches (f = g + weight * h) with a decreasing weight, reusing the work of the
+    previous ones, replanned on every act() under a wall-clock deadline (in seconds). The agent follows the best plan
+    found in time; bound holds that plan's suboptimality bound (math.inf when only a partial plan was found).
+    """
+
+    def __init__(self, state, name: str, h: Callable[[Any, Any, World], float], deadline=1.0, initial_weight=3.0,
+                 weight_step=0.5, limit=math.inf, trace: SearchTrace = None, metrics: SearchMetrics = None):
+        InformedSearchAgent.__init__(self, state, name, h, IndexedPriorityQueue(), limit, trace, metrics=metrics)
+        self.deadline = deadline
+        self.initial_weight = initial_weight
+        self.weight_step = weight_step
+        self.bound = math.inf
+        self.incumbent = None
+        self.nodes, self.h_values, self.inconsistent, self.closed_keys = {}, {}, {}, set()
+
+    def act(self, world):
+        self.clear_plan()
+        node = self.calculate_path()
+        if self.metrics:
+            self.metrics.record("bound", self.bound)
+        if node is None:
             print("Failure")
             self.terminated = 1
             return
@@ -282,14 +620,259 @@ class Bonus(InformedSearchAgent):
         if not self.sequence:
             self.terminated = 1
             return
-        next_move = self.sequence.pop()
+        next_move = self.next_move()
         if not world.valid_action(self.state, next_move):
             print(f"{self.name} Failed")
             self.terminated = 1
             return
         self.handle_move(next_move)
-        if self.goal_state(
-                StateNode(next_move, None, world, world.get_people_status(), world.get_broken_vertices_status())):
+        if self.goal_state(world.state_node(next_move)):
             print("Woohoo!")
             self.terminated = 1
         return next_move
+
+    def calculate_path(self):
+        stop_at = time.perf_counter() + self.deadline
+        root = self.world.state_node(self.state)
+        self.fringe.initialize()
+        self.nodes, self.h_values, self.inconsistent, self.closed_keys = {root.key: root}, {root.key: 0}, {}, set()
+        self.incumbent = root if self.goal_state(root) else None
+        self.bound = math.inf
+        self.fringe.push(root)
+        weight = self.initial_weight
+        while self.improve_path(weight, stop_at):
+            if self.incumbent is None:
+                break
+            self.bound = self.suboptimality_bound(weight)
+            if self.bound <= 1 or weight <= 1:
+                break
+            weight = max(1.0, weight - self.weight_step)
+            # the next search starts from the open and inconsistent nodes, ordered by the new weight
+            reopened = self.fringe.nodes() + list(self.inconsistent.values())
+            self.fringe.initialize()
+            self.inconsistent.clear()
+            self.closed_keys.clear()
+            for node in reopened:
+                node.f_value = node.g_value + weight * self.h_values[node.key]
+                self.fringe.push(node)
+        else:
+            if self.incumbent is not None:
+                self.bound = min(self.bound, self.suboptimality_bound(math.inf))
+        if self.incumbent is not None:
+            return self.incumbent
+        # out of time before reaching any goal, head for the most promising node
+        return self.fringe.peek() if not self.fringe.is_empty() else None
+
+    def improve_path(self, weight, stop_at):
+        # returns False when the deadline or the limit cut the search short
+        iterations = 0
+        while not self.fringe.is_empty():
+            if self.incumbent is not None and self.incumbent.g_value <= self.fringe.peek().f_value:
+                return True
+            iterations += 1
+            # the root, the only node without a parent, is always expanded so there is a first move to make
+            if (iterations > self.limit or time.perf_counter() >= stop_at) and self.fringe.peek().parent is not None:
+                return False
+            node = self.pop()
+            self.closed_keys.add(node.key)
+            if self.trace:
+                self.trace.expansion(node, agent=self.name, weight=weight)
+            if self.metrics:
+                self.metrics.count("expanded")
+            for n in self.world.get_neighbors(node.state):
+                child = self.world.child_node(node, n, g_value=node.g_value + self.world.get_weight(node.state, n))
+                best = self.nodes.get(child.key)
+                if best is not None and best.g_value <= child.g_value:
+                    if self.metrics:
+                        self.metrics.count("duplicates")
+                    continue
+                if child.key not in self.h_values:
+                    if self.metrics:
+                        self.metrics.count("heuristic_calls")
+                        with self.metrics.phase("heuristic"):
+                            self.h_values[child.key] = self.f(node, n, self.world)
+                    else:
+                        self.h_values[child.key] = self.f(node, n, self.world)
+                elif self.metrics:
+                    self.metrics.count("h_cache_hits")
+                if self.metrics:
+                    self.metrics.count("generated")
+                h = self.h_values[child.key]
+                if h == math.inf:
+                    continue
+                self.nodes[child.key] = child
+                child.f_value = child.g_value + weight * h
+                if self.goal_state(child):
+                    if self.incumbent is None or child.g_value < self.incumbent.g_value:
+                        self.incumbent = child
+                elif child.key in self.closed_keys:
+                    self.inconsistent[child.key] = child
+                else:
+                    self.fringe.push(child)
+        return True
+
+    def results(self):
+        return {**InformedSearchAgent.results(self), "bound": self.bound}
+
+    def suboptimality_bound(self, weight):
+        lower = min((n.g_value + self.h_values[n.key] for n in self.fringe.nodes() + list(self.inconsistent.values())),
+                    default=self.incumbent.g_value)
+        if lower >= self.incumbent.g_value:
+            return 1.0
+        return min(weight, self.incumbent.g_value / lower) if lower > 0 else weight
+
+
+class IDAStarAgent(InformedSearchAgent):
+    """
+    IDA*: depth first searches bounded by f, every bound being the smallest f that went over the previous one. Memory
+    is the DFS stack plus a transposition table of at most table_size states with their best g in the current
+    iteration. A state the table forgot may be searched again, but is never wrongly pruned.
+    """
+
+    def __init__(self, state, name: str, f: Callable[[Any, Any, World], float], limit=10000, table_size=100000,
+                 trace: SearchTrace = None, metrics: SearchMetrics = None):
+        InformedSearchAgent.__init__(self, state, name, f, Stack(), limit, trace, metrics=metrics)
+        self.table_size = table_size
+
+    def calculate_path(self):
+        root = self.world.state_node(self.state)
+        bound, iterations, node = 0, 0, root
+        while bound < math.inf:
+            self.fringe.initialize()
+            table = LRUCache(self.table_size)
+            table.put(root.key, 0)
+            self.fringe.push(root)
+            next_bound = math.inf
+            while not self.fringe.is_empty():
+                iterations += 1
+                node = self.fringe.pop()
+                if self.goal_state(node):
+                    return node, SUCCESS
+                if iterations >= self.limit:
+                    return node, FAILURE
+                if self.trace:
+                    self.trace.expansion(node, agent=self.name, bound=bound)
+                if self.metrics:
+                    self.metrics.count("expanded")
+                children = []
+                for n in self.world.get_neighbors(node.state):
+                    child = self.world.child_node(node, n, g_value=node.g_value + self.world.get_weight(node.state, n))
+                    best = table.get(child.key)
+                    if best is None or child.g_value < best:
+                        children.append(child)
+                    elif self.metrics:
+                        self.metrics.count("duplicates")
+                if self.metrics:
+                    self.metrics.count("generated", len(children))
+                    self.metrics.count("heuristic_calls", len(children))
+                self.measured_evaluate(node, children)
+                # the best child is pushed last, so it is searched first. Only pushed children go in the table, f
+                # depends on the parent and the same state may come within the bound through another one.
+                for child in sorted(children, key=lambda c: c.f_value, reverse=True):
+                    if child.f_value > bound:
+                        next_bound = min(next_bound, child.f_value)
+                    else:
+                        table.put(child.key, child.g_value)
+                        self.fringe.push(child)
+            bound = next_bound
+        return node, FAILURE
+
+
+class SMAStarAgent(InformedSearchAgent):
+    """
+    SMA*: best first search holding at most max_nodes search nodes. Expanding a node adds its best successor not in
+    memory, the others wait in the node as (f, vertex) pairs and the node stays queued with the best of their f values.
+    Over the cap, the worst leaf (highest f, the shallowest on ties) is forgotten and goes back to its parent's waiting
+    successors with its backed up f, so a solution is found as long as its path fits in max_nodes.
+    """
+
+    def __init__(self, state, name: str, f: Callable[[Any, Any, World], float], limit=10000, max_nodes=10000,
+                 trace: SearchTrace = None, metrics: SearchMetrics = None):
+        InformedSearchAgent.__init__(self, state, name, f, DoubleEndedPriorityQueue(), limit, trace, metrics=metrics)
+        self.max_nodes = max_nodes
+        # id of a node in memory -> its depth, its children in memory and the heap of its successors waiting to be added
+        self.depths, self.children, self.waiting = {}, {}, {}
+        self.in_memory = 0
+        self.counter = itertools.count()
+
+    def calculate_path(self):
+        root = self.world.state_node(self.state)
+        self.fringe.initialize()
+        self.depths, self.children, self.waiting = {id(root): 0}, {id(root): 0}, {}
+        self.fringe.push(root)
+        self.in_memory = 1
+        iterations, node = 0, root
+        while not self.fringe.is_empty():
+            iterations += 1
+            node = self.fringe.pop()
+            if id(node) not in self.waiting and self.goal_state(node):
+                return node, SUCCESS
+            if node.f_value == math.inf or iterations >= self.limit:
+                return node, FAILURE
+            if id(node) not in self.waiting:
+                if self.depths[id(node)] + 1 >= self.max_nodes:
+                    # its path fills the memory, no child of it can be added
+                    self.forget(node, math.inf)
+                    continue
+                if self.trace:
+                    self.trace.expansion(node, agent=self.name, iteration=iterations)
+                if self.metrics:
+                    self.metrics.count("expanded")
+                self.waiting[id(node)] = self.successors_of(node)
+            waiting = self.waiting[id(node)]
+            if not waiting:
+                self.forget(node, math.inf)
+                continue
+            f_value, _, n = heapq.heappop(waiting)
+            child = self.world.child_node(node, n, f_value, node.g_value + self.world.get_weight(node.state, n))
+            self.children[id(node)] += 1
+            self.depths[id(child)] = self.depths[id(node)] + 1
+            self.children[id(child)] = 0
+            self.in_memory += 1
+            self.fringe.push(child, self.depths[id(child)])
+            if waiting:
+                node.f_value = waiting[0][0]
+                self.fringe.push(node, self.depths[id(node)])
+            while self.in_memory > self.max_nodes:
+                self.forget(self.fringe.pop_worst(self.is_forgettable))
+        return node, FAILURE
+
+    def successors_of(self, node: StateNode) -> list:
+        # the heap of node's successors off its own path, their f at least node's so f never drops along a path
+        path, ancestor = set(), node
+        while ancestor is not None:
+            path.add(ancestor.key)
+            ancestor = ancestor.parent
+        children = [self.world.child_node(node, n, g_value=node.g_value + self.world.get_weight(node.state, n))
+                    for n in self.world.get_neighbors(node.state)]
+        if self.metrics:
+            self.metrics.count("duplicates", sum(child.key in path for child in children))
+        children = [child for child in children if child.key not in path]
+        if self.metrics:
+            self.metrics.count("generated", len(children))
+            self.metrics.count("heuristic_calls", len(children))
+        self.measured_evaluate(node, children)
+        waiting = [(max(child.f_value, node.f_value), next(self.counter), child.state) for child in children]
+        heapq.heapify(waiting)
+        return waiting
+
+    def is_forgettable(self, node: StateNode):
+        return node.parent is not None and not self.children[id(node)]
+
+    def forget(self, node: StateNode, f_value=None):
+        # drops the leaf node, out of the queue, and puts it back among its parent's waiting successors
+        if self.metrics:
+            self.metrics.count("forgotten")
+        self.in_memory -= 1
+        del self.depths[id(node)], self.children[id(node)]
+        self.waiting.pop(id(node), None)
+        parent = node.parent
+        if parent is None:
+            return
+        self.children[id(parent)] -= 1
+        waiting = self.waiting[id(parent)]
+        heapq.heappush(waiting, (node.f_value if f_value is None else f_value, next(self.counter), node.state))
+        if parent in self.fringe:
+            self.fringe.remove(parent)
+        parent.f_value = waiting[0][0]
+        self.fringe.push(parent, self.depths[id(parent)])
@@ -0,0 +1,111 @@
+import argparse
+import contextlib
+import copy
+import csv
+import io
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from Agents import HEURISTICS
+from EnvGenerator import generate_environment, TOPOLOGIES
+from Simulator import Simulator
+
+# benchmark name -> Simulator menu number
+AGENTS = {
+    "StupidGreedy": "2",
+    "Saboteur": "3",
+    "A*": "5",
+    "RT_A*": "6",
+    "Bonus": "7",
+    "ARA*": "8",
+    "IDA*": "9",
+    "SMA*": "10",
+}
+# the agents that take a heuristic, the others run once with heuristic left empty
+SEARCH_AGENTS = ("A*", "RT_A*", "Bonus", "ARA*", "IDA*", "SMA*")
+
+FIELDS = ["topology", "size", "seed", "agent", "heuristic", "wall_time", "expanded", "peak_memory", "cost", "score",
+          "evacuated", "actions"]
+
+
+def run_agent(environment, agent_type: str, location="0", limit=10000, track_memory=True, deadline=1.0,
+              heuristic="mst", memory=10000):
+    simulator = Simulator(environment=copy.deepcopy(environment), headless=True)
+    if track_memory:
+        # tracemalloc slows everything down, so wall times of runs with and without it are not comparable
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, = simulator.run([{"type": AGENTS[agent_type], "location": location, "limit": limit,
+                                   "deadline": deadline, "heuristic": heuristic, "memory": memory}])
+    wall_time = time.perf_counter() - start
+    peak_memory = 0
+    if track_memory:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"agent": agent_type, "heuristic": heuristic if agent_type in SEARCH_AGENTS else "", "wall_time": wall_time,
+            "expanded": results["expanded"], "peak_memory": peak_memory, "cost": results["time"],
+            "score": results["score"], "evacuated": results["evacuated"], "actions": results["actions"]}
+
+
+def run_benchmark(topologies=TOPOLOGIES, sizes=(10, 20, 40), agents=tuple(AGENTS), seeds=(0,), people=None,
+                  brittle=None, limit=10000, track_memory=True, deadline=1.0, heuristics=("mst",), memory=10000):
+    for topology in topologies:
+        for size in sizes:
+            for seed in seeds:
+                environment = generate_environment(topology, size, people or max(2, size // 5),
+                                                   brittle or max(1, size // 10), seed)
+                for agent_type in agents:
+                    for heuristic in heuristics if agent_type in SEARCH_AGENTS else heuristics[:1]:
+                        results = run_agent(environment, agent_type, limit=limit, track_memory=track_memory,
+                                            deadline=deadline, heuristic=heuristic, memory=memory)
+                        yield {"topology": topology, "size": size, "seed": seed, **results}
+
+
+def import_time(module="Simulator", repeat=5):
+    # a fresh interpreter per run, so every import is cold
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    times = [float(subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True,
+                                  check=True).stdout) for _ in range(repeat)]
+    return {"module": module, "min": min(times), "median": statistics.median(times), "max": max(times)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agents on generated environments")
+    parser.add_argument("--topologies", nargs="+", choices=TOPOLOGIES, default=list(TOPOLOGIES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10, 20, 40])
+    parser.add_argument("--agents", nargs="+", choices=list(AGENTS), default=list(AGENTS))
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--people", type=int)
+    parser.add_argument("--brittle", type=int)
+    parser.add_argument("--limit", type=int, default=10000)
+    parser.add_argument("--heuristics", nargs="+", choices=list(HEURISTICS), default=["mst"],
+                        help="compare nodes expanded and wall time of the search agents under each heuristic")
+    parser.add_argument("--deadline", type=float, default=1.0, help="seconds per move of the ARA* agent")
+    parser.add_argument("--memory", type=int, default=10000,
+                        help="transposition table size of IDA*, node cap of SMA*")
+    parser.add_argument("--no-memory", action="store_true", help="skip peak memory tracking")
+    parser.add_argument("--out", help="CSV file to write, stdout by default")
+    parser.add_argument("--import-time", action="store_true", help="only measure the cold import time of Simulator")
+    args = parser.parse_args()
+    if args.import_time:
+        print(import_time())
+        return
+    out = open(args.out, 'w', newline='') if args.out else sys.stdout
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    for row in run_benchmark(args.topologies, args.sizes, args.agents, args.seeds, args.people, args.brittle,
+                             args.limit, not args.no_memory, args.deadline, args.heuristics, args.memory):
+        writer.writerow(row)
+        out.flush()
+    if args.out:
+        out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import argparse
+from typing import Dict, List
+
+import numpy as np
+
+import PatternDatabase
+from Graph import CSRGraph, Graph, ShortestPathOracle
+from util import read_file
+
+
+def validate_environment(environment: Dict):
+    """Raises a ValueError listing every schema problem of a V/E environment."""
+    errors = []
+    V, E = environment.get('V'), environment.get('E')
+    if not isinstance(V, dict) or not isinstance(E, dict):
+        raise ValueError("environment must have a 'V' and an 'E' object")
+    for v, item in V.items():
+        if not isinstance(v, str):
+            errors.append(f"vertex id {v!r} is a {type(v).__name__}, vertex ids must be strings")
+        if not isinstance(item.get("people"), int) or item["people"] < 0:
+            errors.append(f"vertex {v!r}: people must be a non negative int, got {item.get('people')!r}")
+        if item.get("brittle") not in (0, 1):
+            errors.append(f"vertex {v!r}: brittle must be 0 or 1, got {item.get('brittle')!r}")
+    for name, e in E.items():
+        for end in ("v1", "v2"):
+            v = e.get(end)
+            # edge endpoints may be ints, the loader compares them as strings
+            if not isinstance(v, (int, str)) or isinstance(v, bool):
+                errors.append(f"edge {name!r}: {end} must be an int or a string id, got {v!r}")
+            elif str(v) not in V:
+                errors.append(f"edge {name!r}: {end} {v!r} is not a vertex")
+        w = e.get("w")
+        if not isinstance(w, (int, float)) or isinstance(w, bool) or not w > 0:
+            errors.append(f"edge {name!r}: w must be a positive number, got {w!r}")
+    if errors:
+        raise ValueError("invalid environment:\n" + "\n".join(errors))
+
+
+def all_pairs(oracle: ShortestPathOracle):
+    rows = [oracle.dijkstra(source, 0) for source in range(len(oracle.vertices))]
+    distances = np.array([dist for dist, _ in rows]).reshape(len(rows), len(rows))
+    if oracle.core.weights.dtype.kind == 'i' and np.isfinite(distances).all():
+        distances = distances.astype(np.int64)
+    return distances, np.array([pred for _, pred in rows], dtype=np.int32).reshape(len(rows), len(rows))
+
+
+def compile_environment(environment: Dict, path: str, distances=False):
+    validate_environment(environment)
+    V = environment['V']
+    core = CSRGraph.from_edges(list(V), environment['E'])
+    arrays = {"vertices": np.array(core.vertices, dtype=str), "offsets": core.offsets, "neighbors": core.neighbors,
+              "weights": core.weights, "people": np.array([V[v]["people"] for v in core.vertices], dtype=np.int64),
+              "brittle": np.array([V[v]["brittle"] for v in core.vertices], dtype=np.int8)}
+    if distances:
+        arrays["distances"], arrays["predecessors"] = all_pairs(ShortestPathOracle(core))
+    np.savez(path, **arrays)
+
+
+def load_compiled(path: str, mst_cache_size=100000):
+    """
+    Returns the environment (vertices only) and a Graph over the compiled arrays. Loading skips parsing the JSON and
+    the optional all pairs shortest paths, the graph still builds its per vertex rows and adjacency from the arrays.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files}
+    vertices: List[str] = arrays["vertices"].tolist()
+    core = CSRGraph(vertices, arrays["offsets"], arrays["neighbors"], arrays["weights"])
+    oracle = ShortestPathOracle(core, arrays.get("distances"), arrays.get("predecessors"))
+    environment = {'V': {v: {"people": people, "brittle": brittle}
+                         for v, people, brittle in zip(vertices, arrays["people"].tolist(),
+                                                       arrays["brittle"].tolist())}}
+    return environment, Graph(vertices, None, mst_cache_size, core, oracle)
+
+
+def read_environment(path: str, mst_cache_size=100000):
+    # the graph comes with the MST table saved next to the environment, when there is one
+    if path.endswith(".npz"):
+        environment, graph = load_compiled(path, mst_cache_size)
+    else:
+        environment = read_file(path)
+        graph = Graph(list(environment['V']), environment['E'], mst_cache_size)
+    PatternDatabase.attach(graph, path, graph.core.mask(v for v in environment['V']
+                                                        if environment['V'][v]["people"] > 0))
+    return environment, graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile an env.json environment to a binary .npz file")
+    parser.add_argument("source")
+    parser.add_argument("path")
+    parser.add_argument("--distances", action="store_true", help="also store all pairs shortest paths")
+    args = parser.parse_args()
+    compile_environment(read_file(args.source), args.path, args.distances)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import json
+import random
+from typing import Dict
+
+import networkx as nx
+
+TOPOLOGIES = ("random", "grid", "scale-free")
+
+
+def generate_topology(topology: str, size: int, seed=0) -> nx.Graph:
+    if topology == "random":
+        G = nx.gnm_random_graph(size, 2 * size, seed=seed)
+    elif topology == "grid":
+        side = max(1, round(size ** 0.5))
+        G = nx.convert_node_labels_to_integers(nx.grid_2d_graph(side, max(1, size // side)))
+    elif topology == "scale-free":
+        G = nx.barabasi_albert_graph(size, min(2, size - 1), seed=seed) if size > 1 else nx.empty_graph(size)
+    else:
+        raise ValueError(f"unknown topology {topology}, expected one of {TOPOLOGIES}")
+    # chain the components together so every vertex is reachable
+    components = [min(c) for c in nx.connected_components(G)]
+    G.add_edges_from(zip(components, components[1:]))
+    return G
+
+
+def generate_environment(topology="random", size=20, people=5, brittle=3, seed=0, max_weight=5,
+                         max_people=3) -> Dict:
+    rnd = random.Random(seed)
+    G = generate_topology(topology, size, seed)
+    vertices = list(G.nodes)
+    with_people = set(rnd.sample(vertices, min(people, len(vertices))))
+    brittle_vertices = set(rnd.sample(vertices, min(brittle, len(vertices))))
+    V = {str(v): {"people": rnd.randint(1, max_people) if v in with_people else 0,
+                  "brittle": int(v in brittle_vertices)} for v in vertices}
+    E = {f"e{i}": {"v1": v1, "v2": v2, "w": rnd.randint(1, max_weight)} for i, (v1, v2) in enumerate(G.edges)}
+    return {"V": V, "E": E}
+
+
+def write_environment(environment: Dict, path: str):
+    with open(path, 'w') as file:
+        json.dump(environment, file, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate an evacuation environment in the env.json format")
+    parser.add_argument("path")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="random")
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--people", type=int, default=5)
+    parser.add_argument("--brittle", type=int, default=3)
+    parser.add_argument("--max-weight", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_environment(generate_environment(args.topology, args.size, args.people, args.brittle, args.seed,
+                                           args.max_weight), args.path)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 import heapq
+from itertools import count
 
 from World import StateNode
 
@@ -52,8 +53,202 @@ class PriorityQueue(Fringe):
         f_value, node = heapq.heappop(self.queue)
         return node
 
+    def peek(self):
+        return self.queue[0][1]
+
     def is_empty(self):
         return len(self.queue) == 0
 
     def __str__(self):
         return str(self.queue)
+
+
+class IndexedPriorityQueue(Fringe):
+    """
+    Priority queue holding at most one live entry per state key. A better push for a queued state invalidates the
+    old heap entry, which is skipped once it surfaces. Ties on f are popped in push order.
+    """
+
+    def __init__(self):
+        Fringe.__init__(self)
+        self.queue = []
+        self.entries = {}
+        self.counter = count()
+
+    def initialize(self):
+        self.queue = []
+        self.entries = {}
+
+    def push(self, state_node: StateNode):
+        key = state_node.key
+        entry = self.entries.get(key)
+        if entry is not None:
+            queued = entry[2]
+            if (queued.f_value, queued.g_value) <= (state_node.f_value, state_node.g_value):
+                return
+            entry[2] = None
+        self.added_so_far += 1
+        entry = [state_node.f_value, next(self.counter), state_node]
+        self.entries[key] = entry
+        heapq.heappush(self.queue, entry)
+
+    def drop_stale(self):
+        while self.queue and self.queue[0][2] is None:
+            heapq.heappop(self.queue)
+
+    def pop(self):
+        self.drop_stale()
+        f_value, _, node = heapq.heappop(self.queue)
+        del self.entries[node.key]
+        return node
+
+    def peek(self):
+        self.drop_stale()
+        return self.queue[0][2]
+
+    def nodes(self):
+        return [entry[2] for entry in self.entries.values()]
+
+    def is_empty(self):
+        self.drop_stale()
+        return len(self.queue) == 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return str([entry for entry in self.queue if entry[2] is not None])
+
+
+class Stack(Fringe):
+    def __init__(self):
+        Fringe.__init__(self)
+        self.stack = []
+
+    def initialize(self):
+        self.stack = []
+
+    def push(self, state_node: StateNode):
+        self.added_so_far += 1
+        self.stack.append(state_node)
+
+    def pop(self):
+        return self.stack.pop()
+
+    def is_empty(self):
+        return len(self.stack) == 0
+
+    def __len__(self):
+        return len(self.stack)
+
+    def __str__(self):
+        return str(self.stack)
+
+
+class DoubleEndedPriorityQueue(Fringe):
+    """
+    Priority queue popping both its best node (lowest f, then the deepest and the newest) and its worst one (highest
+    f, then the shallowest and the oldest). Each node has an entry in both heaps, the one left behind by a pop is
+    skipped once it surfaces and the heaps are compacted when such entries pile up, so the queue stays proportional to
+    the nodes in it.
+    """
+
+    def __init__(self):
+        Fringe.__init__(self)
+        self.best, self.worst = [], []
+        self.entries = {}
+        self.counter = count()
+
+    def initialize(self):
+        self.best, self.worst = [], []
+        self.entries = {}
+
+    def push(self, state_node: StateNode, depth=0):
+        self.added_so_far += 1
+        n = next(self.counter)
+        entry = [state_node]
+        self.entries[id(state_node)] = entry
+        heapq.heappush(self.best, (state_node.f_value, -depth, -n, entry))
+        heapq.heappush(self.worst, (-state_node.f_value, depth, n, entry))
+        if len(self.best) > 2 * len(self.entries) + 64:
+            self.best = [item for item in self.best if item[-1][0] is not None]
+            self.worst = [item for item in self.worst if item[-1][0] is not None]
+            heapq.heapify(self.best)
+            heapq.heapify(self.worst)
+
+    def remove(self, state_node: StateNode):
+        self.entries.pop(id(state_node))[0] = None
+
+    def pop_from(self, heap: list, accept=None):
+        # the first node accept holds for, the ones skipped stay in the queue
+        skipped = []
+        while True:
+            item = heapq.heappop(heap)
+            node = item[-1][0]
+            if node is None:
+                continue
+            if accept is None or accept(node):
+                break
+            skipped.append(item)
+        for item in skipped:
+            heapq.heappush(heap, item)
+        self.remove(node)
+        return node
+
+    def pop(self):
+        return self.pop_from(self.best)
+
+    def pop_worst(self, accept=None):
+        return self.pop_from(self.worst, accept)
+
+    def __contains__(self, state_node: StateNode):
+        return id(state_node) in self.entries
+
+    def is_empty(self):
+        return len(self.entries) == 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return str([entry[0] for entry in self.entries.values()])
+
+
+class VisitedMap:
+    """
+    Best node seen per canonical state key, and the keys already expanded.
+    With reopen, a cheaper path to an expanded state reopens it instead of being dropped.
+    """
+
+    def __init__(self, reopen=False):
+        self.best_nodes = {}
+        self.expanded = set()
+        self.reopen = reopen
+
+    def clear(self):
+        self.best_nodes.clear()
+        self.expanded.clear()
+
+    def offer(self, state_node: StateNode):
+        # duplicate detection on generation: keep a node only if it improves the best g of a state not yet expanded
+        key = state_node.key
+        best = self.best_nodes.get(key)
+        if key in self.expanded and not self.reopen or best is not None and best.g_value <= state_node.g_value:
+            return False
+        self.expanded.discard(key)
+        self.best_nodes[key] = state_node
+        return True
+
+    def should_expand(self, state_node: StateNode):
+        key = state_node.key
+        best = self.best_nodes.get(key)
+        if key in self.expanded or best is not None and best.g_value < state_node.g_value:
+            return False
+        self.expanded.add(key)
+        return True
+
+    def __contains__(self, state_node: StateNode):
+        return state_node.key in self.expanded
+
+    def __len__(self):
+        return len(self.expanded)
@@ -1,28 +1,61 @@
+import heapq
 import math
+from itertools import count
 from typing import Dict, List
-import networkx as nx
-import matplotlib.pyplot as plt
-from pyvis.network import Network
+import numpy as np
+
+from util import LRUCache
 
 
 class Graph:
-    def __init__(self, vertices: List, edges: Dict):
-        self.G = nx.Graph()
-        self.G.add_nodes_from(vertices)
-        self.G.add_edges_from((str(e["v1"]), str(e["v2"]), {"weight": e["w"]}) for e in edges.values())
-        self.pos = nx.spring_layout(self.G)  # for drawing
+    def __init__(self, vertices: List, edges: Dict, mst_cache_size=100000, core: 'CSRGraph' = None,
+                 oracle: 'ShortestPathOracle' = None):
+        self.core = core if core is not None else CSRGraph.from_edges(vertices, edges)
+        self._G = None
+        self._pos = None
+        self.oracle = oracle if oracle is not None else ShortestPathOracle(self.core)
+        self.mst_cache = LRUCache(mst_cache_size)
+        # an optional PatternDatabase.MSTPatternDatabase, looked up before computing an MST
+        self.mst_table = None
+        self.mst_table_hits = 0
+        self.landmarks = {}
+
+    @property
+    def G(self):
+        # networkx is only needed for drawing, so the nx graph is built on first use
+        if self._G is None:
+            import networkx as nx
+            self._G = nx.Graph()
+            self._G.add_nodes_from(self.core.vertices)
+            self._G.add_weighted_edges_from(self.core.edges())
+        return self._G
+
+    @property
+    def pos(self):
+        # the layout is only needed for drawing, so it is computed on the first display
+        if self._pos is None:
+            import networkx as nx
+            self._pos = nx.spring_layout(self.G)
+        return self._pos
 
     def get_weight(self, v1, v2):
-        assert v2 in self.G[v1], f"{v2} not in {v2}"
-        return self.G[v1][v2]["weight"]
+        i = self.core.index[v1]
+        row = self.core.neighbor_rows[i]
+        j = self.core.index.get(v2)
+        assert j in row, f"{v2} not in {v1}"
+        return self.core.weight_rows[i][row.index(j)]
 
     def get_neighbors(self, v1):
-        return self.G.neighbors(v1)
+        return iter(self.core.neighbor_names[self.core.index[v1]])
 
     def valid_move(self, src, dst):
-        return dst in self.G[src]
+        return self.core.index.get(dst) in self.core.neighbor_rows[self.core.index[src]]
 
     def display(self, nodes_labels):
+        # the drawing stack is slow to import, so headless runs never load it
+        import matplotlib.pyplot as plt
+        import networkx as nx
+        # from pyvis.network import Network
         # nt = Network(height="750px", width="100%", bgcolor="#222222", font_color="white")
         # nt.from_nx(self.G)
         # nt.show("Graph.html")
@@ -33,22 +66,132 @@ class Graph:
         plt.show()
 
     def get_shortest_path(self, v1, v2, without=()):
-        without_nodes = self.G.copy()
-        without_nodes.remove_nodes_from(set(without) - {v1})
-        if v2 in without_nodes.nodes and nx.has_path(without_nodes, v1, v2):
-            return nx.single_source_dijkstra(without_nodes, v1, v2)
-        return math.inf, []
+        return self.oracle.table(without).shortest_path(v1, v2)
+
+    def get_nearest_target(self, v1, targets, without=()):
+        return self.oracle.table(without).nearest(v1, targets)
+
+    def break_vertex(self, node, broken_before=()):
+        self.oracle.break_vertex(node, broken_before)
 
     def change_to_infinite(self, node):
-        for v1, v2 in nx.edges(self.G, node):
-            self.G[v1][v2]["weight"] = float("inf")
+        self.core.change_to_infinite(self.core.index[node])
+        self._G = None
+        self.oracle = ShortestPathOracle(self.core)
+        self.mst_cache.clear()
+        self.mst_table = None
+        self.mst_table_hits = 0
+        self.landmarks.clear()
+
+    def get_MST_size(self, around_nodes: list, without_nodes=(), method="prim", last=None):
+        last = None if last is None else self.core.index[last]
+        return self.get_MST_size_of_masks(self.core.mask(around_nodes), self.core.mask(without_nodes), method, last)
+
+    def get_MST_size_of_masks(self, around_mask: int, without_mask=0, method="prim", last: int = None):
+        """
+        The MST size over around, a pair of vertices being as far apart as the shortest path from the first of them
+        without the other vertices of without_mask. Vertices come in index order with last, when given, after all the
+        others, like the people then the child of the MST heuristic. Prim's sizes are cached on the sets and last.
+        networkx is the reference to check them against and always runs.
+        """
+        around = order_around(self.core.indices_of(around_mask), last)
+        if method != "prim":
+            return self.compute_MST_size([self.core.vertices[v] for v in around], self.core.vertices_of(without_mask))
+        size = self.known_MST_size(around_mask, without_mask, last)
+        if size is None:
+            size = prim_MST_size(self.distance_matrix(around, without_mask))
+            self.mst_cache.put((around_mask, without_mask, last), size)
+        return size
+
+    def known_MST_size(self, around_mask: int, without_mask=0, last: int = None):
+        size = self.mst_cache.get((around_mask, without_mask, last))
+        if size is None and self.mst_table is not None:
+            size = self.mst_table.size(around_mask, without_mask, last)
+            if size is not None:
+                with self.mst_cache.lock:
+                    self.mst_table_hits += 1
+        return size
+
+    def get_MST_cache_stats(self):
+        # a size the pattern table answered was missed by the LRU cache but not computed, so it is no miss
+        with self.mst_cache.lock:
+            stats, table_hits = self.mst_cache.stats(), self.mst_table_hits
+        return {**stats, "misses": stats["misses"] - table_hits, "table_hits": table_hits}
+
+    def landmark_distances(self, k=4):
+        table = self.landmarks.get(k)
+        if table is None:
+            table = self.landmarks[k] = self.oracle.landmark_distances(k)
+        return table
+
+    def get_landmark_bound(self, source: int, targets: List[int], k=4):
+        """
+        The ALT lower bound on the distance from source to the farthest target: |d(L, source) - d(L, t)| for every
+        landmark L. Breaking vertices only makes distances longer, so the bound holds for every broken set.
+        """
+        bound = 0
+        for row in self.landmark_distances(k):
+            d = row[source]
+            for t in targets:
+                # a landmark reaching neither vertex says nothing
+                if row[t] != d:
+                    bound = max(bound, abs(d - row[t]))
+        return bound
+
+    def get_farthest_distance(self, source: int, targets: List[int], without_mask=0):
+        row = self.oracle.table_of(without_mask).row(source)[0]
+        return max((row[t] for t in targets), default=0)
+
+    def get_MST_sizes_with(self, base_mask: int, extra: List[int], without_mask=0):
+        """
+        MST sizes of base + {v} for every vertex index v in extra, v coming last like in get_MST_size_of_masks, all
+        derived from the MST of base: the MST of base and v is the MST of base's tree edges together with the edges
+        from every vertex of base to v.
+        """
+        sizes = [self.known_MST_size(base_mask | 1 << v, without_mask, v) for v in extra]
+        missing = [i for i, size in enumerate(sizes) if size is None]
+        if not missing:
+            return sizes
+        base = self.core.indices_of(base_mask)
+        dist = self.distance_matrix(base, without_mask)
+        base_size, parents = prim_MST(dist)
+        if base_size == math.inf:
+            for i in missing:
+                sizes[i] = self.get_MST_size_of_masks(base_mask | 1 << extra[i], without_mask, last=extra[i])
+            return sizes
+        tree_edges = sorted((dist[j, parents[j]].item(), j, parents[j]) for j in range(1, len(base)))
+        table = self.oracle.table_of(without_mask)
+        base_rows = [table.row(b)[0] for b in base]
+        for i in missing:
+            v = extra[i]
+            if base_mask >> v & 1:
+                # v moves behind the rest of base, so base's tree does not apply
+                sizes[i] = self.get_MST_size_of_masks(base_mask, without_mask, last=v)
+                continue
+            # v comes last, so every edge of the star is measured from the base vertex
+            star = [(row[v], j, len(base)) for j, row in enumerate(base_rows)]
+            sizes[i] = kruskal_MST_size(len(base) + 1, sorted(tree_edges + star))
+            self.mst_cache.put((base_mask | 1 << v, without_mask, v), sizes[i])
+        return sizes
+
+    def distance_matrix(self, around: list, without_mask=0):
+        # like compute_MST_size, the distance between around[i] and around[j] (i < j) is measured from around[i],
+        # which is only not the same from around[j] when one of them is in without_mask
+        table = self.oracle.table_of(without_mask)
+        k = len(around)
+        dist = np.zeros((k, k))
+        for i, v_i in enumerate(around):
+            row = table.row(v_i)[0]
+            dist[i, i + 1:] = [row[v_j] for v_j in around[i + 1:]]
+        return dist + dist.T
 
-    def get_MST_size(self, around_nodes: list, without_nodes=()):
+    def compute_MST_size(self, around_nodes: list, without_nodes=()):
+        import networkx as nx
         full_graph_around_nodes = nx.Graph()
+        table = self.oracle.table(without_nodes)
         for i, v_i in enumerate(around_nodes):
             for j, v_j in enumerate(around_nodes[i + 1:]):
-                dist, path = self.get_shortest_path(v_i, v_j, without_nodes)
-                full_graph_around_nodes.add_edge(v_i, v_j, weight=dist)
+                full_graph_around_nodes.add_edge(v_i, v_j, weight=table.distance(v_i, v_j))
         mst = nx.minimum_spanning_tree(full_graph_around_nodes)
         # pos = nx.spring_layout(full_graph_around_nodes)
         # subax1 = plt.subplot(121)
@@ -61,4 +204,304 @@ class Graph:
         #
         # plt.show()
 
-        return mst.size(weight="weight")
+        return tree_size([w for _, _, w in mst.edges(data="weight")])
+
+
+def order_around(around: List[int], last: int = None):
+    # the vertex indices in index order, last moved behind the others
+    if last is None or last not in around:
+        return around
+    return [v for v in around if v != last] + [last]
+
+
+def prim_MST_size(dist: np.ndarray):
+    """
+    Total weight of a minimum spanning tree over a dense, symmetric distance matrix, math.inf if it is disconnected.
+    """
+    return prim_MST(dist)[0]
+
+
+def prim_MST(dist: np.ndarray):
+    # returns the total weight and the tree as the parent of every vertex but the first
+    k = len(dist)
+    parents = [0] * k
+    if k < 2:
+        return 0, parents
+    in_tree = np.zeros(k, dtype=bool)
+    in_tree[0] = True
+    best = dist[0].copy()
+    best_parent = np.zeros(k, dtype=int)
+    weights = []
+    for _ in range(k - 1):
+        j = int(np.argmin(np.where(in_tree, np.inf, best)))
+        if in_tree[j] or best[j] == math.inf:
+            return math.inf, parents
+        weights.append(best[j].item())
+        in_tree[j] = True
+        parents[j] = int(best_parent[j])
+        closer = dist[j] < best
+        best[closer] = dist[j][closer]
+        best_parent[closer] = j
+    return tree_size(weights), parents
+
+
+def kruskal_MST_size(k: int, edges: List):
+    # edges are (weight, u, v) tuples sorted by weight, over vertices 0..k-1
+    component = list(range(k))
+
+    def find(u):
+        while component[u] != u:
+            component[u] = component[component[u]]
+            u = component[u]
+        return u
+
+    weights = []
+    for w, u, v in edges:
+        ru, rv = find(u), find(v)
+        if ru != rv:
+            component[ru] = rv
+            weights.append(w)
+            if len(weights) == k - 1:
+                return tree_size(weights)
+    return tree_size(weights) if len(weights) == k - 1 else math.inf
+
+
+def tree_size(weights: List[float]):
+    # every MST of a graph has the same edge weights, summed exactly they give the same size whichever tree was found
+    return math.fsum(sorted(weights))
+
+
+class CSRGraph:
+    """
+    The graph with vertices interned as ints 0..n-1 in CSR form: the neighbors of vertex i are
+    neighbors[offsets[i]:offsets[i + 1]], with the matching weights. neighbor_rows, weight_rows and neighbor_names hold
+    the same rows as tuples for cheap lookups from Python. Neighbors keep the order networkx would give them.
+    """
+
+    def __init__(self, vertices: List, offsets: np.ndarray, neighbors: np.ndarray, weights: np.ndarray):
+        # the NumPy arrays are kept as given, the Python rows below are built from them once per graph, also for a
+        # compiled environment
+        self.vertices = list(vertices)
+        self.index = {v: i for i, v in enumerate(self.vertices)}
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.weights = weights
+        bounds = offsets.tolist()
+        neighbors, weights = neighbors.tolist(), weights.tolist()
+        self.neighbor_rows = [tuple(neighbors[a:b]) for a, b in zip(bounds, bounds[1:])]
+        self.weight_rows = [tuple(weights[a:b]) for a, b in zip(bounds, bounds[1:])]
+        self.neighbor_names = [tuple(self.vertices[u] for u in row) for row in self.neighbor_rows]
+
+    @classmethod
+    def from_edges(cls, vertices: List, edges: Dict):
+        adjacency = {v: {} for v in vertices}
+        for e in edges.values():
+            v1, v2 = str(e["v1"]), str(e["v2"])
+            adjacency.setdefault(v1, {})[v2] = e["w"]
+            adjacency.setdefault(v2, {})[v1] = e["w"]
+        index = {v: i for i, v in enumerate(adjacency)}
+        offsets = np.zeros(len(adjacency) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(neighbors) for neighbors in adjacency.values()])
+        # integer weights stay integers, so path costs keep their type
+        weights = np.array([w for neighbors in adjacency.values() for w in neighbors.values()])
+        neighbors = np.array([index[u] for neighbors in adjacency.values() for u in neighbors], dtype=np.int32)
+        return cls(adjacency, offsets, neighbors, weights if weights.size else weights.astype(np.float64))
+
+    def edges(self):
+        return [(self.vertices[i], self.vertices[j], w)
+                for i, (row, weights) in enumerate(zip(self.neighbor_rows, self.weight_rows))
+                for j, w in zip(row, weights) if i <= j]
+
+    def change_to_infinite(self, i: int):
+        self.weights = self.weights.astype(np.float64)
+        for j in self.neighbor_rows[i]:
+            for a, b in ((i, j), (j, i)):
+                self.weight_rows[a] = tuple(math.inf if u == b else w
+                                            for u, w in zip(self.neighbor_rows[a], self.weight_rows[a]))
+                self.weights[self.offsets[a]:self.offsets[a + 1]] = self.weight_rows[a]
+
+    def mask(self, nodes):
+        mask = 0
+        for v in nodes:
+            if v in self.index:
+                mask |= 1 << self.index[v]
+        return mask
+
+    @staticmethod
+    def indices_of(mask: int):
+        indices = []
+        while mask:
+            low = mask & -mask
+            indices.append(low.bit_length() - 1)
+            mask ^= low
+        return indices
+
+    def vertices_of(self, mask: int):
+        return [self.vertices[i] for i in self.indices_of(mask)]
+
+
+class ShortestPathOracle:
+    """
+    Shortest paths over the CSR graph, one table per broken set.
+    A table row holds the distances and predecessors of a single source, computed by Dijkstra on first use.
+    Like Graph.get_shortest_path, the source itself is never removed, even when it is broken.
+    """
+
+    def __init__(self, core: CSRGraph, distances: np.ndarray = None, predecessors: np.ndarray = None):
+        self.core = core
+        # optional all pairs rows without broken vertices, precomputed by EnvCompiler
+        self.distances = distances
+        self.predecessors = predecessors
+        self.vertices = core.vertices
+        self.index = core.index
+        # neighbors in the order nx.Graph.copy() lays them out, so equal length paths are broken the same way
+        adjacency = [{} for _ in self.vertices]
+        for v, (row, weights) in enumerate(zip(core.neighbor_rows, core.weight_rows)):
+            for u, w in zip(row, weights):
+                adjacency[v].setdefault(u, w)
+                adjacency[u].setdefault(v, w)
+        self.adjacency = [list(neighbors.items()) for neighbors in adjacency]
+        self.tables = {0: PathTable(self, 0)}
+
+    def mask(self, nodes):
+        return self.core.mask(nodes)
+
+    def indices_of(self, mask: int):
+        return self.core.indices_of(mask)
+
+    def table(self, without=()):
+        return self.table_of(self.mask(without))
+
+    def table_of(self, removed: int):
+        table = self.tables.get(removed)
+        if table is None:
+            table = self.derive(removed)
+            self.tables[removed] = table
+        return table
+
+    def derive(self, removed: int):
+        # reuse a table whose broken set differs by a single vertex, if there is one
+        for b in self.indices_of(removed):
+            parent = self.tables.get(removed & ~(1 << b))
+            if parent is not None:
+                return parent.without_vertex(b)
+        return PathTable(self, removed)
+
+    def landmark_distances(self, k: int):
+        # farthest point selection: every next landmark is the vertex farthest from the ones chosen so far
+        rows = []
+        closest = [math.inf] * len(self.vertices)
+        landmark = 0
+        for _ in range(min(k, len(self.vertices))):
+            rows.append(self.table_of(0).row(landmark)[0])
+            closest = [min(a, b) for a, b in zip(closest, rows[-1])]
+            landmark = max(range(len(closest)), key=closest.__getitem__)
+        return rows
+
+    def break_vertex(self, node, broken_before=()):
+        before = self.mask(broken_before)
+        after = before | 1 << self.index[node]
+        if after != before and after not in self.tables:
+            self.tables[after] = self.table_of(before).without_vertex(self.index[node])
+
+    def row(self, source: int, removed: int):
+        if not removed and self.distances is not None:
+            return self.distances[source].tolist(), self.predecessors[source].tolist()
+        return self.dijkstra(source, removed)
+
+    def dijkstra(self, source: int, removed: int, targets: set = None):
+        """
+        Same relaxation and tie-breaking as networkx's single_source_dijkstra. With targets, the search stops once
+        every vertex as close as the nearest target is settled, and only the settled entries are final.
+        """
+        dist = [math.inf] * len(self.vertices)
+        pred = [-1] * len(self.vertices)
+        settled = [False] * len(self.vertices)
+        dist[source] = 0
+        c = count()
+        heap = [(0, next(c), source)]
+        nearest = math.inf
+        while heap:
+            d, _, v = heapq.heappop(heap)
+            if d > nearest:
+                break
+            if settled[v]:
+                continue
+            settled[v] = True
+            if targets is not None and v in targets:
+                nearest = d
+            for u, w in self.adjacency[v]:
+                if removed >> u & 1 and u != source:
+                    continue
+                vu_dist = d + w
+                if vu_dist < dist[u]:
+                    dist[u] = vu_dist
+                    pred[u] = v
+                    heapq.heappush(heap, (vu_dist, next(c), u))
+        return dist, pred
+
+
+class PathTable:
+    def __init__(self, oracle: ShortestPathOracle, removed: int, rows=None):
+        self.oracle = oracle
+        self.removed = removed
+        self.rows = rows if rows is not None else {}
+
+    def row(self, source: int):
+        row = self.rows.get(source)
+        if row is None:
+            row = self.rows[source] = self.oracle.row(source, self.removed)
+        return row
+
+    def distance(self, v1, v2):
+        if v2 not in self.oracle.index:
+            return math.inf
+        return self.row(self.oracle.index[v1])[0][self.oracle.index[v2]]
+
+    def shortest_path(self, v1, v2):
+        dist = self.distance(v1, v2)
+        if dist == math.inf:
+            return math.inf, []
+        _, pred = self.row(self.oracle.index[v1])
+        return dist, self.path_to(pred, self.oracle.index[v2])
+
+    def nearest(self, v1, targets):
+        """
+        The distance and shortest path to the nearest of targets, the first of them in iteration order on ties
+        (math.inf and [] when none is reachable). Without a cached row of v1, a single Dijkstra runs until the
+        nearest targets are settled.
+        """
+        source = self.oracle.index[v1]
+        targets = [self.oracle.index[v] for v in targets if v in self.oracle.index]
+        row = self.rows.get(source)
+        if row is None:
+            row = self.oracle.dijkstra(source, self.removed, set(targets))
+        dist, pred = row
+        target = min(targets, key=dist.__getitem__, default=None)
+        if target is None or dist[target] == math.inf:
+            return math.inf, []
+        return dist[target], self.path_to(pred, target)
+
+    def path_to(self, pred: list, v: int):
+        path = []
+        while v != -1:
+            path.append(self.oracle.vertices[v])
+            v = pred[v]
+        path.reverse()
+        return path
+
+    def without_vertex(self, b: int):
+        """
+        The table for this broken set plus b. Rows in which b is a leaf of the shortest path tree (or the source)
+        stay valid once b is dropped from them, the rest are recomputed on demand.
+        """
+        rows = {}
+        # a copy, another thread may still be filling rows of this table
+        for source, (dist, pred) in list(self.rows.items()):
+            if source == b:
+                rows[source] = dist, pred
+            elif b not in pred:
+                dist, pred = dist.copy(), pred.copy()
+                dist[b], pred[b] = math.inf, -1
+                rows[source] = dist, pred
+        return PathTable(self.oracle, self.removed | 1 << b, rows)
@@ -0,0 +1,62 @@
+import json
+import time
+from collections import defaultdict
+
+
+class PhaseTimer:
+    def __init__(self, timers: defaultdict, name: str):
+        self.timers = timers
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timers[self.name] += time.perf_counter() - self.start
+
+
+class SearchMetrics:
+    """
+    Opt-in counters, per phase timers (in seconds) and recorded values of a search agent. Agents only touch it behind
+    an `if self.metrics:` check, so a disabled agent (metrics=None) pays nothing. end_act closes the numbers of one
+    act() call, the totals cover the whole run and values keep the last one recorded.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.timers = defaultdict(float)
+        self.values = {}
+        self.acts = []
+        self.phases = {}
+        self.last_counters, self.last_timers = {}, {}
+
+    def count(self, name: str, n=1):
+        self.counters[name] += n
+
+    def add_time(self, name: str, seconds: float):
+        self.timers[name] += seconds
+
+    def record(self, name: str, value):
+        self.values[name] = value
+
+    def phase(self, name: str) -> PhaseTimer:
+        timer = self.phases.get(name)
+        if timer is None:
+            timer = self.phases[name] = PhaseTimer(self.timers, name)
+        return timer
+
+    def end_act(self, wall_time: float):
+        self.timers["act"] += wall_time
+        self.acts.append({"counters": {k: v - self.last_counters.get(k, 0) for k, v in self.counters.items()},
+                          "timers": {k: v - self.last_timers.get(k, 0) for k, v in self.timers.items()},
+                          "values": dict(self.values)})
+        self.last_counters, self.last_timers = dict(self.counters), dict(self.timers)
+
+    def to_dict(self):
+        return {"counters": dict(self.counters), "timers": dict(self.timers), "values": self.values, "acts": self.acts}
+
+    def export(self, path: str, **fields):
+        with open(path, 'w') as file:
+            json.dump({**fields, **self.to_dict()}, file, indent=2)
@@ -0,0 +1,105 @@
+import argparse
+import hashlib
+import os
+from typing import List
+
+import numpy as np
+
+from Graph import Graph, prim_MST_size
+
+MAX_PEOPLE = 20
+
+
+class MSTPatternDatabase:
+    """
+    Precomputed MST sizes, without broken vertices, of every subset of the people vertices, alone (row 0) and together
+    with each of a few extra locations coming last (one row per location). Row entries are indexed by the subset as a
+    bitmask over people. Anything else, like a broken set or an extra vertex without a row, is left to Graph to
+    compute.
+    """
+
+    def __init__(self, people: List[int], locations: List[int], sizes: np.ndarray, fingerprint: str):
+        self.people = people
+        self.people_mask = sum(1 << p for p in people)
+        self.rows = {-1: 0, **{location: i + 1 for i, location in enumerate(locations)}}
+        self.sizes = sizes
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, graph: Graph, people_mask: int, locations=()):
+        people = graph.core.indices_of(people_mask)
+        if len(people) > MAX_PEOPLE:
+            raise ValueError(f"{len(people)} people vertices, the table is limited to {MAX_PEOPLE}")
+        locations = [location for location in locations if not people_mask >> location & 1]
+        sizes = np.zeros((len(locations) + 1, 1 << len(people)))
+        for row, last in enumerate([None] + locations):
+            for subset in range(1 << len(people)):
+                around = [p for j, p in enumerate(people) if subset >> j & 1]
+                sizes[row, subset] = prim_MST_size(graph.distance_matrix(around if last is None else around + [last]))
+        return cls(people, locations, sizes, cls.fingerprint_of(graph, people_mask))
+
+    @staticmethod
+    def fingerprint_of(graph: Graph, people_mask: int):
+        # a table only applies to the graph and people set it was built for
+        digest = hashlib.sha1("\0".join(graph.core.vertices).encode())
+        for array in (graph.core.offsets, graph.core.neighbors, graph.core.weights):
+            digest.update(array.dtype.str.encode())
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(str(people_mask).encode())
+        return digest.hexdigest()
+
+    def size(self, around_mask: int, without_mask=0, last: int = None):
+        # None when the table does not cover these sets, last being the location of the row or None for row 0
+        rest = around_mask & ~self.people_mask
+        if without_mask or rest != (0 if last is None else 1 << last):
+            return None
+        row = self.rows.get(-1 if last is None else last)
+        if row is None:
+            return None
+        subset = 0
+        for j, p in enumerate(self.people):
+            if around_mask >> p & 1:
+                subset |= 1 << j
+        return self.sizes[row, subset].item()
+
+    def save(self, path: str):
+        locations = sorted(self.rows, key=self.rows.get)[1:]
+        np.savez(path, people=np.array(self.people, dtype=np.int64), locations=np.array(locations, dtype=np.int64),
+                 sizes=self.sizes, fingerprint=np.array(self.fingerprint))
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["people"].tolist(), data["locations"].tolist(), data["sizes"], str(data["fingerprint"]))
+
+
+def table_path(environment_path: str):
+    # env.json and its compiled env.npz share env.mst.npz
+    return os.path.splitext(environment_path)[0] + ".mst.npz"
+
+
+def attach(graph: Graph, environment_path: str, people_mask: int):
+    """Gives graph the table saved next to the environment, if there is one and it was built for this graph."""
+    path = table_path(environment_path)
+    if os.path.exists(path):
+        table = MSTPatternDatabase.load(path)
+        if table.fingerprint == MSTPatternDatabase.fingerprint_of(graph, people_mask):
+            graph.mst_table = table
+    return graph.mst_table
+
+
+def main():
+    from EnvCompiler import read_environment
+    parser = argparse.ArgumentParser(description="Precompute the MST sizes of people subsets next to an environment")
+    parser.add_argument("path", help="env.json or a compiled .npz environment")
+    parser.add_argument("--locations", nargs="*", default=[],
+                        help="vertices to also pair with every subset, 'all' for every vertex")
+    args = parser.parse_args()
+    environment, graph = read_environment(args.path)
+    people_mask = graph.core.mask(v for v in environment['V'] if environment['V'][v]["people"] > 0)
+    locations = graph.core.vertices if args.locations == ["all"] else args.locations
+    MSTPatternDatabase.build(graph, people_mask, [graph.core.index[v] for v in locations]).save(table_path(args.path))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,13 @@
-from typing import List
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Union
 
 import Fringes
 from Agents import *
+from Graph import Graph
+from Metrics import SearchMetrics
+from EnvCompiler import read_environment
 from World import World
 from util import read_file
 
@@ -13,14 +19,24 @@ Greedy search agent: 4
 A* agent: 5
 Real time A* agent: 6
 A* with company (like saboteur): 7
+Anytime A* (ARA*) with a deadline per move: 8
+IDA* with a bounded transposition table: 9
+SMA* with a bounded number of nodes: 10
 """
 
+# what run() uses for settings an agent config leaves out, the interactive flow asks for them instead
+DEFAULTS = {"limit": 10000, "deadline": 1.0, "table_size": 100000, "max_nodes": 10000}
+
 
 class Simulator:
-    def __init__(self, path: str):
+    def __init__(self, path: str = None, mst_cache_size=100000, headless=False, environment: Dict = None,
+                 graph: Graph = None):
         self.agents = []
-        env = read_file(path)
-        self.world = World(env)
+        self.headless = headless
+        if environment is None:
+            # .json or compiled .npz environment, with its MST table when one was saved next to it
+            environment, graph = read_environment(path, mst_cache_size)
+        self.world = World(environment, mst_cache_size, graph)
         for agent in self.agents:
             agent.set_world(self.world)
 
@@ -32,17 +48,113 @@ class Simulator:
         self.set_args()
         self.start_rounds()
 
+    def run(self, agents_config: Union[str, Dict, List[Dict]], asynchronous=False, timeout: float = None):
+        """
+        Runs the simulation without any input() call, agents_config is a list (or a JSON file / dict with an
+        "agents" list) of {"type": <menu number>, "location": <start vertex>, "limit": <optional limit>,
+        "incremental": <optional, types 6 and 7>, "deadline": <seconds, type 8>, "metrics": <optional bool>,
+        "heuristic": <optional key of HEURISTICS, "mst" by default>, "workers": <optional, type 5 evaluates f in that
+        many processes>, "memory": <transposition table size of type 9, node cap of type 10>,
+        "timeout": <optional seconds per turn, asynchronous runs only>}. Missing limits, deadlines and memory sizes
+        take their DEFAULTS, and human agents (type 1), which need input(), are rejected with a ValueError.
+        asynchronous runs the rounds with start_rounds_async, timeout being the default time per turn.
+        Returns the results of every agent, with the agent's SearchMetrics under "metrics" when it was asked for.
+        """
+        if isinstance(agents_config, str):
+            agents_config = read_file(agents_config)
+        if isinstance(agents_config, dict):
+            agents_config = agents_config["agents"]
+        if any(str(a["type"]) == '1' for a in agents_config):
+            raise ValueError("human agents need input(), run() only takes automatic agents")
+        self.agents = [self.get_agent_from_input(str(a["type"]), str(a["location"]), a.get("limit"),
+                                                 a.get("incremental", False), a.get("deadline"),
+                                                 a.get("heuristic", "mst"), a.get("workers"),
+                                                 a.get("memory"), interactive=False)
+                       for a in agents_config]
+        for agent, a in zip(self.agents, agents_config):
+            if a.get("metrics"):
+                agent.metrics = SearchMetrics()
+        agents = list(self.agents)
+        self.set_args()
+        if asynchronous:
+            timeouts = {agent: a.get("timeout", timeout) for agent, a in zip(self.agents, agents_config)}
+            asyncio.run(self.start_rounds_async(timeouts))
+        else:
+            self.start_rounds()
+        return [{**agent.results(), "metrics": agent.metrics.to_dict()} if agent.metrics else agent.results()
+                for agent in agents]
+
     def start_rounds(self):
-        self.display()
+        if not self.headless:
+            self.display()
         while self.agents:
             for agent in self.agents:
+                start = time.perf_counter()
                 dst = agent.act(self.world)
+                if agent.metrics:
+                    agent.metrics.end_act(time.perf_counter() - start)
                 if dst:
                     self.handle_move(dst)
-                print(agent)
-                self.display()
+                if not self.headless:
+                    print(agent)
+                    self.display()
             self.agents = [a for a in self.agents if not a.terminated]
 
+    async def start_rounds_async(self, timeouts: Dict[Agent, float] = None):
+        """
+        Every round, the agents deliberate at once in threads on a snapshot of the world, each for at most its
+        timeout (seconds, None waits). Their moves are then applied to the world in the agents' order through
+        handle_move, so results do not depend on which agent finished first. An agent past its timeout does a
+        no-op; it keeps deliberating, sits the next rounds out as no-ops too, and its move is applied in the round
+        it is ready in, if it is still valid then.
+        """
+        timeouts = timeouts or {}
+        loop = asyncio.get_running_loop()
+        deliberating = {}
+        if not self.headless:
+            self.display()
+        with ThreadPoolExecutor(max_workers=max(1, len(self.agents))) as executor:
+            while self.agents:
+                snapshot = self.world.snapshot()
+                for agent in self.agents:
+                    if agent not in deliberating:
+                        deliberating[agent] = loop.run_in_executor(executor, self.deliberate, agent, snapshot)
+                await asyncio.gather(*(self.wait_for(deliberating[agent], timeouts.get(agent))
+                                       for agent in self.agents))
+                for agent in self.agents:
+                    if not deliberating[agent].done():
+                        continue
+                    dst = deliberating.pop(agent).result()
+                    agent.world = self.world
+                    if dst and self.world.valid_action(agent.state, dst):
+                        agent.handle_move(dst)
+                        self.handle_move(dst)
+                    if not self.headless:
+                        print(agent)
+                        self.display()
+                self.agents = [a for a in self.agents if not a.terminated]
+
+    @staticmethod
+    async def wait_for(future: asyncio.Future, timeout: float):
+        try:
+            # shielded, an agent past its timeout keeps deliberating
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    @staticmethod
+    def deliberate(agent: Agent, world: World):
+        # act on the snapshot with the move left out, start_rounds_async applies it to the world
+        agent.world = world
+        agent.handle_move = lambda dst: None
+        start = time.perf_counter()
+        try:
+            return agent.act(world)
+        finally:
+            del agent.handle_move
+            if agent.metrics:
+                agent.metrics.end_act(time.perf_counter() - start)
+
     def handle_move(self, dst):
         self.world.handle_brittle(dst)
 
@@ -56,7 +168,20 @@ class Simulator:
             agents.append(agent)
         self.agents = agents
 
-    def get_agent_from_input(self, agent_no, agent_location):
+    def get_agent_from_input(self, agent_no, agent_location, limit=None, incremental=False, deadline=None,
+                             heuristic="mst", workers=None, memory=None, interactive=True):
+        # heuristic is a key of HEURISTICS, used by the search agents (4 to 10)
+        h, f = HEURISTICS[heuristic]
+
+        def ask(value, name, prompt, cast):
+            # 0 is a setting too, only None is missing
+            if value is not None:
+                return value
+            return cast(input(prompt)) if interactive else DEFAULTS[name]
+
+        # the search agents that never ask for their limit
+        fixed_limit = DEFAULTS["limit"] if limit is None else limit
+
         if agent_no == '1':
             return HumanAgent(agent_location, "Human")
         if agent_no == '2':
@@ -64,20 +189,28 @@ class Simulator:
         if agent_no == '3':
             return SaboteurAgent(agent_location, "Saboteur")
         if agent_no == '4':
-            return InformedSearchAgent(agent_location, "PureHeuristic", InformedSearchAgent.MST_heuristic,
-                                       Fringes.PriorityQueue())
+            return InformedSearchAgent(agent_location, "PureHeuristic", h, Fringes.PriorityQueue(), fixed_limit)
         if agent_no == '5':
-            limit = int(input("Enter Limit: "))
-            return InformedSearchAgent(agent_location, "A*", InformedSearchAgent.A_star_func, Fringes.PriorityQueue(),
-                                       limit)
+            limit = ask(limit, "limit", "Enter Limit: ", int)
+            if workers:
+                return ParallelSearchAgent(agent_location, "A*", f, Fringes.PriorityQueue(), limit, workers)
+            return InformedSearchAgent(agent_location, "A*", f, Fringes.PriorityQueue(), limit)
         if agent_no == '6':
-            L = int(input("Enter L: "))
-            return RTInformedSearchAgent(agent_location, "RT_A*", InformedSearchAgent.A_star_func,
-                                         Fringes.PriorityQueue(),
-                                         limit=L)
-        return Bonus(agent_location, "A*", InformedSearchAgent.A_star_func, Fringes.PriorityQueue())
+            L = ask(limit, "limit", "Enter L: ", int)
+            return RTInformedSearchAgent(agent_location, "RT_A*", f, Fringes.PriorityQueue(), limit=L,
+                                         incremental=incremental)
+        if agent_no == '8':
+            deadline = ask(deadline, "deadline", "Enter deadline per move (seconds): ", float)
+            return AnytimeSearchAgent(agent_location, "ARA*", h, deadline, limit=math.inf if limit is None else limit)
+        if agent_no == '9':
+            memory = ask(memory, "table_size", "Enter transposition table size: ", int)
+            return IDAStarAgent(agent_location, "IDA*", f, fixed_limit, table_size=memory)
+        if agent_no == '10':
+            memory = ask(memory, "max_nodes", "Enter max nodes: ", int)
+            return SMAStarAgent(agent_location, "SMA*", f, fixed_limit, max_nodes=memory)
+        return Bonus(agent_location, "A*", f, Fringes.PriorityQueue(), fixed_limit, incremental=incremental)
 
     def set_args(self):
         for agent in self.agents:
-            agent.set_goal_state(lambda state: sum(state.people_status.values()) == 0)
+            agent.set_goal_state(lambda state: state.remaining_people == 0)
             agent.set_world(self.world)
@@ -0,0 +1,112 @@
+import argparse
+import contextlib
+import copy
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
+
+from EnvCompiler import read_environment
+from Simulator import Simulator
+from util import read_file
+
+FIELDS = ["environment", "location", "seed", "type", "agent", "score", "time", "evacuated", "actions", "expanded",
+          "wall_time"]
+
+# environment path -> (environment, Graph), filled once per worker process
+_environments = {}
+
+
+def load_environment(path: str):
+    if path not in _environments:
+        _environments[path] = read_environment(path)
+    return _environments[path]
+
+
+def run_scenario(scenario: Dict) -> List[Dict]:
+    environment, graph = load_environment(scenario["environment"])
+    random.seed(scenario["seed"])
+    np.random.seed(scenario["seed"])
+    agents = [{"location": scenario["location"], **agent} for agent in scenario["agents"]]
+    simulator = Simulator(environment=copy.deepcopy(environment), headless=True, graph=graph)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = simulator.run(agents)
+    wall_time = time.perf_counter() - start
+    return [{"environment": scenario["environment"], "location": scenario["location"], "seed": scenario["seed"],
+             "type": str(agent["type"]), "agent": result.pop("name"), **result, "wall_time": wall_time}
+            for agent, result in zip(agents, results)]
+
+
+def make_scenarios(environments: List[str], agents: List[Dict], locations=None, seeds=(0,)):
+    for path in environments:
+        for location, seed in itertools.product(locations or list(load_environment(path)[0]['V']), seeds):
+            yield {"environment": path, "agents": agents, "location": str(location), "seed": seed}
+
+
+def sweep(scenarios, workers=None):
+    """Runs the scenarios over a process pool and yields result rows as soon as each scenario finishes."""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_scenario, scenario) for scenario in scenarios]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+def summarize(rows: List[Dict]):
+    groups = {}
+    for row in rows:
+        groups.setdefault((row["environment"], row["type"], row["agent"]), []).append(row)
+    return [{"environment": environment, "type": agent_type, "agent": agent, "runs": len(group),
+             **{field: sum(row[field] for row in group) / len(group)
+                for field in ("score", "time", "evacuated", "actions", "expanded", "wall_time")}}
+            for (environment, agent_type, agent), group in sorted(groups.items())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run agent configurations over many scenarios in parallel")
+    parser.add_argument("--environments", nargs="+", required=True)
+    parser.add_argument("--config", required=True, help="JSON agents config, as accepted by Simulator.run")
+    parser.add_argument("--locations", nargs="+", help="start vertices, all vertices of each environment by default")
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", help="CSV file for the per scenario rows, stdout by default")
+    parser.add_argument("--metrics", help="JSON lines file for the search metrics of every agent run")
+    args = parser.parse_args()
+    agents = read_file(args.config)
+    if isinstance(agents, dict):
+        agents = agents["agents"]
+    if args.metrics:
+        agents = [{**agent, "metrics": True} for agent in agents]
+    out = open(args.out, 'w', newline='') if args.out else sys.stdout
+    metrics = open(args.metrics, 'w') if args.metrics else None
+    writer = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    rows = []
+    for row in sweep(make_scenarios(args.environments, agents, args.locations, args.seeds), args.workers):
+        writer.writerow(row)
+        out.flush()
+        if metrics and "metrics" in row:
+            metrics.write(json.dumps({field: row[field] for field in ("environment", "location", "seed", "agent")}
+                                     | row["metrics"]) + "\n")
+        rows.append(row)
+    if args.out:
+        out.close()
+    if metrics:
+        metrics.close()
+    summary = summarize(rows)
+    if summary:
+        writer = csv.DictWriter(sys.stderr, fieldnames=list(summary[0]))
+        writer.writeheader()
+        writer.writerows(summary)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import json
+import random
+
+from World import StateNode
+
+OFF = 0
+EXPANSIONS = 1
+ALL = 2
+
+
+class SearchTrace:
+    """
+    Opt-in search trace written as JSON lines. EXPANSIONS records expanded nodes, ALL also records every push.
+    Only a sample_rate fraction of the events is kept, and lines are buffered before they reach the file.
+    """
+
+    def __init__(self, path: str, level=ALL, sample_rate=1.0, buffer_size=1000, seed=0):
+        self.path = path
+        self.level = level
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.random = random.Random(seed)
+        self.buffer = []
+        self.file = None
+
+    def record(self, event: str, level, node: StateNode, **fields):
+        if level > self.level or (self.sample_rate < 1 and self.random.random() >= self.sample_rate):
+            return
+        self.buffer.append(json.dumps({"event": event, "state": node.state, "f": node.f_value, "g": node.g_value,
+                                       **fields}))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def expansion(self, node: StateNode, **fields):
+        self.record("expand", EXPANSIONS, node, **fields)
+
+    def push(self, node: StateNode, **fields):
+        self.record("push", ALL, node, **fields)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        if self.file is None:
+            self.file = open(self.path, 'a')
+        self.file.write("\n".join(self.buffer) + "\n")
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,17 +1,36 @@
+import copy
 from functools import total_ordering
-from typing import Dict, Set
 
 from Graph import Graph
 from util import values_to_keys
 
 
 class World:
-    def __init__(self, environment):
+    def __init__(self, environment, mst_cache_size=100000, graph: Graph = None):
         self.environment = environment
-        V = [v for v in environment['V']]
-        E = environment['E']
         self.broken_nodes = set()
-        self.graph = Graph(V, E)
+        # a prebuilt graph (and its shortest path and MST caches) can be shared by worlds of the same environment,
+        # compiled environments only come with a graph and no 'E'
+        if graph is None and 'E' not in environment:
+            raise ValueError("the environment has no 'E', a compiled environment needs the graph loaded with it")
+        self.graph = graph if graph is not None else Graph(list(environment['V']), environment['E'], mst_cache_size)
+        self.vertices = self.graph.core.vertices
+        self.vertex_index = self.graph.core.index
+        # search states only carry bitmasks, people counts are read from the initial environment
+        self.initial_people = tuple(environment['V'][v]["people"] if v in environment['V'] else 0
+                                    for v in self.vertices)
+        self.people_mask = self.vertices_mask(v for v, n in zip(self.vertices, self.initial_people) if n > 0)
+        self.brittle_vertices = tuple(v for v in environment['V'] if environment['V'][v]["brittle"])
+        self.brittle_mask = self.vertices_mask(self.brittle_vertices)
+        self.broken_mask = 0
+        # vertices with people left and brittle vertices not broken yet, kept up to date by clear_people and
+        # handle_brittle. The agents goal test the current world itself through them in O(1); unlike a StateNode of
+        # the agent's location, the world does not count the people at that location as rescued before they are.
+        self.remaining_people = sum(1 for v in environment['V'] if environment['V'][v]["people"] > 0)
+        self.remaining_brittle = len(self.brittle_vertices)
+        # answers that depend on the current people and broken state, shared by all the agents of the world until
+        # handle_brittle or clear_people changes that state. Graph caches what only depends on the broken set.
+        self.cache = {}
 
     def valid_action(self, src, dst):
         return dst not in self.broken_nodes and self.graph.valid_move(src, dst)
@@ -22,7 +41,7 @@ class World:
             s = ""
             if v in self.broken_nodes:
                 s += 'X\n'
-            elif v in self.get_brittle_vertices():
+            elif item["brittle"]:
                 s += 'B\n'
             s += f"v:{v}\np:{item['people']}"
             if v in agents_locations:
@@ -43,60 +62,153 @@ class World:
         return self.graph.get_neighbors(v1)
 
     def handle_brittle(self, node):
-        if self.environment['V'][node]["brittle"]:
+        if self.environment['V'][node]["brittle"] and node not in self.broken_nodes:
+            self.graph.break_vertex(node, self.broken_nodes)
             self.broken_nodes.add(node)
+            self.broken_mask |= 1 << self.vertex_index[node]
+            self.remaining_brittle -= 1
+            self.invalidate()
 
     def clear_people(self, node):
-        self.environment['V'][node]["people"] = 0
+        if self.environment['V'][node]["people"]:
+            self.environment['V'][node]["people"] = 0
+            self.remaining_people -= 1
+            self.invalidate()
+
+    def snapshot(self):
+        # a copy of the world state sharing the graph and its caches
+        return copy.deepcopy(self, {id(self.graph): self.graph})
+
+    def invalidate(self):
+        self.cache.clear()
+
+    def cached(self, key, compute):
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
 
     def get_people_status(self):
         return {v: self.environment['V'][v]["people"] for v in self.environment['V']}
 
+    def get_people_vertices(self):
+        return self.cached("people", lambda: tuple(v for v in self.environment['V']
+                                                   if self.environment['V'][v]["people"] > 0))
+
     def get_broken_vertices_status(self):
         return self.broken_nodes.copy()
 
     def get_shortest_path(self, v1, v2):
         return self.graph.get_shortest_path(v1, v2, self.broken_nodes)
 
+    def get_nearest_target(self, v1, targets):
+        return self.graph.get_nearest_target(v1, targets, self.broken_nodes)
+
     def get_brittle_vertices(self):
-        return filter(lambda node: self.environment['V'][node]["brittle"], self.environment['V'])
+        return self.brittle_vertices
+
+    def is_broken(self, v):
+        return v in self.broken_nodes
+
+    def simulate_rescued(self, location: int, previous_rescued: int):
+        return previous_rescued | 1 << location
 
-    def simulate_people_status(self, v, previous_ps: Dict):
-        res = previous_ps.copy()
-        res[v] = 0
-        return res
+    def simulate_broken(self, location: int, previous_broken: int):
+        return previous_broken | self.brittle_mask & 1 << location
 
-    def simulate_broken_vertices(self, v, previous_bvs):
-        res = previous_bvs.copy()
-        if self.environment['V'][v]["brittle"] and v not in res:
-            res.add(v)
-        return res
+    def vertices_mask(self, vertices):
+        return self.graph.core.mask(vertices)
 
-    def get_MST_size(self, around_nodes=None, without_nodes=()):
+    def state_node(self, state, f_value=0, g_value=0):
+        # the search state of an agent standing at state in the current world
+        location = self.vertex_index[state]
+        return StateNode(location, None, self, self.simulate_rescued(location, self.rescued_mask()),
+                         self.simulate_broken(location, self.broken_mask), f_value, g_value)
+
+    def child_node(self, parent: 'StateNode', state, f_value=0, g_value=0):
+        location = self.vertex_index[state]
+        return StateNode(location, parent, self, self.simulate_rescued(location, parent.rescued),
+                         self.simulate_broken(location, parent.broken), f_value, g_value)
+
+    def rescued_mask(self):
+        # vertices without people left, vertices that never had any included
+        return self.cached("rescued", lambda: self.vertices_mask(v for v in self.environment['V']
+                                                                 if self.environment['V'][v]["people"] == 0))
+
+    def get_MST_size(self, around_nodes=None, without_nodes=(), method="prim", last=None):
+        # method: "prim" runs over a dense NumPy distance matrix, "networkx" over an nx complete graph
         if not around_nodes:
             around_nodes = list(self.environment['V'].keys())
-        return self.graph.get_MST_size(around_nodes, without_nodes)
+        return self.graph.get_MST_size(around_nodes, without_nodes, method, last)
+
+    def get_MST_size_of_masks(self, around_mask: int, without_mask=0, method="prim", last: int = None):
+        return self.graph.get_MST_size_of_masks(around_mask, without_mask, method, last)
+
+    def get_MST_sizes_with(self, base_mask: int, extra, without_mask=0):
+        return self.graph.get_MST_sizes_with(base_mask, extra, without_mask)
+
+    def get_landmark_bound(self, location: int, targets_mask: int):
+        return self.graph.get_landmark_bound(location, self.graph.core.indices_of(targets_mask))
+
+    def get_farthest_distance(self, location: int, targets_mask: int, without_mask=0):
+        return self.graph.get_farthest_distance(location, self.graph.core.indices_of(targets_mask), without_mask)
+
+    def get_MST_cache_stats(self):
+        return self.graph.get_MST_cache_stats()
 
 
 @total_ordering
 class StateNode:
-
-    def __init__(self, state, parent, world: World, people_status: Dict, broken_nodes_status: Set, f_value=0,
-                 g_value=0):
-        self.state = state
+    """
+    A search state: the agent's location index and bitmasks of the rescued and broken vertices.
+    people_status and broken_nodes_status are rebuilt from the world on demand, the remaining counts for goal tests
+    are popcounts of the masks.
+    """
+    __slots__ = ("location", "parent", "world", "rescued", "broken", "f_value", "g_value")
+
+    def __init__(self, location: int, parent, world: World, rescued: int, broken: int, f_value=0, g_value=0):
+        self.location = location
+        self.parent = parent
+        self.world = world
+        self.rescued = rescued
+        self.broken = broken
         self.f_value = f_value
         self.g_value = g_value
-        self.parent = parent
-        self.people_status = world.simulate_people_status(state, people_status)
-        self.broken_nodes_status = world.simulate_broken_vertices(state, broken_nodes_status)
-        print(self)
+
+    @property
+    def state(self):
+        return self.world.vertices[self.location]
+
+    @property
+    def key(self):
+        return self.location, self.rescued, self.broken
+
+    @property
+    def people_status(self):
+        return {v: 0 if self.rescued >> i & 1 else n_people
+                for i, (v, n_people) in enumerate(zip(self.world.vertices, self.world.initial_people))}
+
+    @property
+    def broken_nodes_status(self):
+        return set(self.world.graph.core.vertices_of(self.broken))
+
+    @property
+    def remaining_people(self):
+        # vertices of the initial world whose people this state has not rescued
+        return (self.world.people_mask & ~self.rescued).bit_count()
+
+    @property
+    def remaining_brittle(self):
+        return (self.world.brittle_mask & ~self.broken).bit_count()
 
     def __eq__(self, other):
-        return self.state == other.state and self.people_status == other.people_status and self.broken_nodes_status == other.broken_nodes_status
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
 
     def __gt__(self, other):
-        return (self.f_value, len(self.broken_nodes_status), self.state) > (
-            other.f_value, len(other.broken_nodes_status), other.state)
+        return (self.f_value, self.broken.bit_count(), self.state) > (
+            other.f_value, other.broken.bit_count(), other.state)
 
     def __str__(self):
         return f"StateNode(state={self.state}, f_value={self.f_value}, g_value={self.g_value}, people_status={self.people_status}, broken_nodes_status={self.broken_nodes_status})"
@@ -0,0 +1,39 @@
+import copy
+
+import pytest
+
+from EnvGenerator import generate_environment, TOPOLOGIES
+from Simulator import Simulator
+
+
+def run_agent(environment: dict, agent: dict):
+    # every run gets its own copy, a world clears the people it rescues from its environment
+    simulator = Simulator(headless=True, environment=copy.deepcopy(environment))
+    return simulator.run([{"location": "0", **agent}])[0]
+
+
+def plan_cost(environment: dict, agent: dict):
+    return run_agent(environment, agent)["time"]
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+@pytest.mark.parametrize("seed", range(3))
+def test_parallel_A_star_matches_serial(topology, seed):
+    environment = generate_environment(topology, 10, 4, 2, seed)
+    assert plan_cost(environment, {"type": 5, "workers": 2}) == plan_cost(environment, {"type": 5})
+
+
+def test_memory_bounded_agents_match_A_star():
+    # a table of 4 states and 12 nodes in memory, SMA* has to forget nodes on some of the maps
+    forgotten = 0
+    for topology in TOPOLOGIES:
+        for seed in range(3):
+            environment = generate_environment(topology, 12, 5, 2, seed)
+            cost = plan_cost(environment, {"type": 5})
+            assert plan_cost(environment, {"type": 9, "memory": 4}) == cost
+            sma = run_agent(environment, {"type": 10, "memory": 12, "metrics": True})
+            assert sma["time"] == cost
+            counters = sma["metrics"]["counters"]
+            assert counters["heuristic_calls"] == counters["generated"] > 0
+            forgotten += counters.get("forgotten", 0)
+    assert forgotten > 0
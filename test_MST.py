@@ -0,0 +1,126 @@
+import math
+import random
+
+import networkx as nx
+import pytest
+
+from Agents import InformedSearchAgent
+from EnvGenerator import generate_environment, TOPOLOGIES
+from PatternDatabase import MSTPatternDatabase
+from World import World
+
+
+def baseline_MST_size(G: nx.Graph, around_nodes: list, without_nodes=()):
+    # the original MST heuristic: every pair measured from its earlier vertex, which is never removed
+    full_graph_around_nodes = nx.Graph()
+    for i, v_i in enumerate(around_nodes):
+        for v_j in around_nodes[i + 1:]:
+            without = G.copy()
+            without.remove_nodes_from(set(without_nodes) - {v_i})
+            if v_j in without.nodes and nx.has_path(without, v_i, v_j):
+                dist = nx.dijkstra_path_length(without, v_i, v_j)
+            else:
+                dist = math.inf
+            full_graph_around_nodes.add_edge(v_i, v_j, weight=dist)
+    return nx.minimum_spanning_tree(full_graph_around_nodes).size(weight="weight")
+
+
+def random_walk_nodes(world: World, start: str, length: int, rng: random.Random):
+    node = world.state_node(start)
+    yield node
+    for _ in range(length):
+        node = world.child_node(node, rng.choice(list(world.get_neighbors(node.state))))
+        yield node
+
+
+def check_MST_heuristic(world: World, start: str, seed: int):
+    G = world.graph.G
+    for node in random_walk_nodes(world, start, 12, random.Random(seed)):
+        people = [v for v, n_people in node.people_status.items() if n_people > 0]
+        children = list(world.get_neighbors(node.state))
+        expected = [math.inf if world.is_broken(c) else baseline_MST_size(G, people + [c], node.broken_nodes_status)
+                    for c in children]
+        assert [InformedSearchAgent.MST_heuristic(node, c, world) for c in children] == expected
+        assert InformedSearchAgent.MST_heuristic_batch(node, children, world) == expected
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+@pytest.mark.parametrize("seed", range(3))
+def test_MST_heuristic_matches_baseline(topology, seed):
+    check_MST_heuristic(World(generate_environment(topology, 10, 5, 3, seed)), "0", seed)
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+@pytest.mark.parametrize("seed", range(3))
+def test_MST_heuristic_matches_baseline_with_people_on_a_broken_vertex(topology, seed):
+    # like after a saboteur broke it, people left on a broken vertex are only reachable from it
+    environment = generate_environment(topology, 9, 4, 4, seed)
+    world = World(environment)
+    broken = [v for v in world.get_people_vertices() if v != "0"][:2]
+    for v in broken:
+        environment['V'][v]["brittle"] = 1
+        world.handle_brittle(v)
+    check_MST_heuristic(world, "0", seed)
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+@pytest.mark.parametrize("seed", range(3))
+def test_prim_matches_networkx(topology, seed):
+    environment = generate_environment(topology, 12, 5, 3, seed)
+    world = World(environment)
+    rng = random.Random(seed)
+    sizes = []
+    for _ in range(40):
+        around = rng.sample(world.vertices, rng.randint(1, 6))
+        without = rng.sample([v for v in world.vertices if v not in around], rng.randint(0, 4))
+        prim = world.get_MST_size(around, without, method="prim")
+        # networkx has to really run, not answer with the Prim size just cached
+        hits = world.get_MST_cache_stats()["hits"]
+        assert world.get_MST_size(around, without, method="networkx") == prim
+        assert world.get_MST_cache_stats()["hits"] == hits
+        sizes.append(prim)
+    # a vertex cut off by removing all its neighbors leaves the MST disconnected
+    v = world.vertices[0]
+    neighbors = list(world.get_neighbors(v))
+    around = [v, rng.choice([u for u in world.vertices if u != v and u not in neighbors])]
+    assert world.get_MST_size(around, neighbors, method="prim") == math.inf
+    assert world.get_MST_size(around, neighbors, method="networkx") == math.inf
+    assert any(0 < size < math.inf for size in sizes)
+
+
+def fractional_environment(topology: str, seed: int):
+    environment = generate_environment(topology, 12, 5, 3, seed)
+    rng = random.Random(seed)
+    for e in environment['E'].values():
+        e["w"] = round(rng.uniform(0.1, 5), 3)
+    return environment
+
+
+@pytest.mark.parametrize("topology", TOPOLOGIES)
+@pytest.mark.parametrize("seed", range(3))
+def test_MST_heuristic_batch_matches_per_child_with_fractional_weights(topology, seed):
+    # separate worlds, so neither answer comes from the other's cache
+    environment = fractional_environment(topology, seed)
+    world, batch_world = World(environment), World(environment)
+    rng = random.Random(seed)
+    for node in random_walk_nodes(world, "0", 12, rng):
+        children = list(world.get_neighbors(node.state))
+        assert InformedSearchAgent.MST_heuristic_batch(node, children, batch_world) == [
+            InformedSearchAgent.MST_heuristic(node, c, world) for c in children]
+    for _ in range(20):
+        around = rng.sample(world.vertices, rng.randint(2, 7))
+        without = rng.sample([v for v in world.vertices if v not in around], rng.randint(0, 3))
+        assert world.get_MST_size(around, without, method="prim") == world.get_MST_size(around, without,
+                                                                                         method="networkx")
+
+
+def test_pattern_table_answers_are_no_cache_misses():
+    world = World(generate_environment("random", 10, 5, 3, 0))
+    world.graph.mst_table = MSTPatternDatabase.build(world.graph, world.people_mask, range(len(world.vertices)))
+    for node in random_walk_nodes(world, "0", 12, random.Random(0)):
+        for c in world.get_neighbors(node.state):
+            InformedSearchAgent.MST_heuristic(node, c, world)
+    stats = world.get_MST_cache_stats()
+    assert stats["table_hits"] > 0
+    # every miss computed a size and cached it
+    assert stats["misses"] == stats["size"]
@@ -1,11 +1,12 @@
 import json
+import threading
+from collections import OrderedDict
 from typing import Dict
 
 
 def read_file(path: str):
     with open(path, 'r') as file:
-        data = file.read()
-        return json.loads(data)
+        return json.load(file)
 
 
 def values_to_keys(d: Dict):
@@ -13,3 +14,48 @@ def values_to_keys(d: Dict):
     for k, v in d.items():
         new_dic[v] = new_dic.get(v, []) + [k]
     return new_dic
+
+
+class LRUCache:
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self.data = OrderedDict()
+        self.hits, self.misses = 0, 0
+        # agents deliberating in threads share the caches of a graph
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.data:
+                self.hits += 1
+                self.data.move_to_end(key)
+                return self.data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits, self.misses = 0, 0
+
+    def stats(self):
+        return {"size": len(self.data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != "lock"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)